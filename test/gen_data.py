@@ -51,6 +51,7 @@ UNAME = 'Linux bencher8 4.9.0-3-amd64 #1 SMP Debian 4.9.30-2+deb9u5 (2017-09-19)
 AUDIT = { 'uname': UNAME }
 ITERS = 2000
 KEY = 'dummybmark:dummyvm:0'  # 0th pexec.
+KEY2 = 'dummybmark:dummyvm2:0'  # As KEY, but on a second VM.
 
 
 def create_filename(nth):
@@ -58,13 +59,14 @@ def create_filename(nth):
                         'example' + str(nth) + '.json.bz2')
 
 
-def create_random_results():
+def create_random_results(keys=(KEY,)):
     results = { 'audit': AUDIT,
-                'wallclock_times': { KEY: [[]] },
-                'core_cycle_counts': { KEY: [[]] },
+                'wallclock_times': dict((key, [[]]) for key in keys),
+                'core_cycle_counts': dict((key, [[]]) for key in keys),
               }
-    for _ in xrange(ITERS):
-        results['wallclock_times'][KEY][0].append(random.random())
+    for key in keys:
+        for _ in xrange(ITERS):
+            results['wallclock_times'][key][0].append(random.random())
     return results
 
 
@@ -75,3 +77,5 @@ if __name__ == '__main__':
     # We create two example data files, so that we can diff them.
     write_krun_results_file(create_random_results(), create_filename(1))
     write_krun_results_file(create_random_results(), create_filename(2))
+    # A third file holds results from two VMs, so that they can be compared.
+    write_krun_results_file(create_random_results((KEY, KEY2)), create_filename(3))
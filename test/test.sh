@@ -43,10 +43,26 @@ set -e
 
 ./bin/mark_outliers_in_json -w 200 test/example1.json.bz2
 ./bin/mark_outliers_in_json -w 200 test/example2.json.bz2
+./bin/mark_outliers_in_json -w 200 test/example3.json.bz2
 ./bin/mark_changepoints_in_json -s 1500 test/example1_outliers_w200.json.bz2
 ./bin/mark_changepoints_in_json -s 1500 test/example2_outliers_w200.json.bz2
+./bin/mark_changepoints_in_json -s 1500 test/example3_outliers_w200.json.bz2
 ./bin/plot_krun_results --with-outliers --with-changepoints test/example1_outliers_w200_changepoints.json.bz2 -o test/plots1.pdf
 ./bin/plot_krun_results --with-outliers --with-changepoints test/example2_outliers_w200_changepoints.json.bz2 -o test/plots2.pdf
+./bin/plot_krun_results --jobs 2 --with-outliers --with-changepoints test/example2_outliers_w200_changepoints.json.bz2 -o test/plots2_jobs.pdf
+./bin/plot_krun_results --html --with-outliers --with-changepoints test/example2_outliers_w200_changepoints.json.bz2 -o test/plots2.html
+./bin/plot_krun_results --html --one-page test/example2_outliers_w200_changepoints.json.bz2 -o test/plots2_one_page.html
+rm -rf test/page_cache
+./bin/plot_krun_results --page-cache test/page_cache --with-outliers --with-changepoints test/example2_outliers_w200_changepoints.json.bz2 -o test/plots2_cached.pdf
+./bin/plot_krun_results --no-downsample --rasterize-data --with-outliers --with-changepoints test/example2_outliers_w200_changepoints.json.bz2 -o test/plots2_raster.pdf
 ./bin/table_classification_summaries_others test/example1_outliers_w200_changepoints.json.bz2 -o test/table1.tex
 ./bin/table_classification_summaries_others test/example2_outliers_w200_changepoints.json.bz2 -o test/table2.tex
 ./bin/diff_results -r test/example1_outliers_w200_changepoints.json.bz2 test/example2_outliers_w200_changepoints.json.bz2 --tex test/diff.tex
+rm -f test/results.db
+./bin/warmup_db --db test/results.db ingest test/example1_outliers_w200_changepoints.json.bz2 test/example2_outliers_w200_changepoints.json.bz2 test/example3_outliers_w200_changepoints.json.bz2
+./bin/warmup_db --db test/results.db query --benchmark dummybmark
+./bin/diff_results --db test/results.db -r 1 2 --two-sample-test --html test/diff_db.html
+./bin/diff_results --summary-cache test/summaries -r test/example1_outliers_w200_changepoints.json.bz2 test/example2_outliers_w200_changepoints.json.bz2 --html test/diff.html
+./bin/diff_results --input-summaries test/summaries/example1_outliers_w200_changepoints_summary.json test/summaries/example2_outliers_w200_changepoints_summary.json --tex test/diff_summaries.tex
+./bin/warmup_trend --summary-cache test/summaries -j test/trend.json --html test/trend.html test/example1_outliers_w200_changepoints.json.bz2 test/example2_outliers_w200_changepoints.json.bz2 test/summaries/example2_outliers_w200_changepoints_summary.json
+./bin/warmup_stats --html --output-vm-matrix test/vms.html --db test/results.db 3
@@ -0,0 +1,319 @@
+# Copyright (c) 2018 King's College London
+# created by the Software Development Team <http://soft-dev.org/>
+#
+# The Universal Permissive License (UPL), Version 1.0
+#
+# Subject to the condition set forth below, permission is hereby granted to any
+# person obtaining a copy of this software, associated documentation and/or
+# data (collectively the "Software"), free of charge and under any and all
+# copyright rights in the Software, and any and all patent rights owned or
+# freely licensable by each licensor hereunder covering either (i) the
+# unmodified Software as contributed to or provided by such licensor, or (ii)
+# the Larger Works (as defined below), to deal in both
+#
+# (a) the Software, and
+# (b) any piece of software and/or hardware listed in the lrgrwrks.txt file if
+# one is included with the Software (each a "Larger Work" to which the Software
+# is contributed by such licensors),
+#
+# without restriction, including without limitation the rights to copy, create
+# derivative works of, display, perform, and distribute the Software and make,
+# use, sell, offer for sale, import, export, have made, and have sold the
+# Software and the Larger Work(s), and to sublicense the foregoing rights on
+# either these or other terms.
+#
+# This license is subject to the following condition: The above copyright
+# notice and either this complete permission notice or at a minimum a reference
+# to the UPL must be included in all copies or substantial portions of the
+# Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""A local SQLite warehouse of Krun results.
+
+Each ingested Krun results file becomes one run. Iteration data (wallclock
+times, core cycle counts) and per-pexec annotations (outliers, changepoints)
+are stored as packed little-endian blobs, one row per process execution, so
+that a query for a single benchmark reads only the rows it needs rather than
+decompressing whole results files.
+
+read_run() reconstructs a dictionary in the same format as
+read_krun_results_file(), so any code which consumes Krun data can read
+from a database instead.
+"""
+
+import datetime
+import hashlib
+import json
+import numpy
+import os.path
+import sqlite3
+
+from warmup.krun_results import get_machine_name, read_krun_results_file
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    filename TEXT NOT NULL,
+    sha1 TEXT NOT NULL UNIQUE,
+    machine TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    ingest_date TEXT NOT NULL,
+    pexec_keys TEXT NOT NULL,
+    extra TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS benchmarks (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    benchmark TEXT NOT NULL,
+    vm TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    UNIQUE (run_id, benchmark, vm, variant)
+);
+CREATE TABLE IF NOT EXISTS pexecs (
+    benchmark_id INTEGER NOT NULL REFERENCES benchmarks(id),
+    pexec INTEGER NOT NULL,
+    wallclock_times BLOB NOT NULL,
+    num_cores INTEGER,
+    core_cycle_counts BLOB,
+    all_outliers BLOB,
+    common_outliers BLOB,
+    unique_outliers BLOB,
+    changepoints BLOB,
+    changepoint_means BLOB,
+    changepoint_vars BLOB,
+    classification TEXT,
+    PRIMARY KEY (benchmark_id, pexec)
+);
+CREATE INDEX IF NOT EXISTS runs_machine ON runs (machine);
+CREATE INDEX IF NOT EXISTS runs_run_date ON runs (run_date);
+CREATE INDEX IF NOT EXISTS benchmarks_vm ON benchmarks (vm);
+CREATE INDEX IF NOT EXISTS benchmarks_benchmark ON benchmarks (benchmark);
+"""
+
+# Per-pexec annotations written by mark_outliers_in_json and
+# mark_changepoints_in_json, with the numpy type used to pack each one.
+_PACKED_ANNOTATIONS = (('all_outliers', '<i8'), ('common_outliers', '<i8'),
+                       ('unique_outliers', '<i8'), ('changepoints', '<i8'),
+                       ('changepoint_means', '<f8'), ('changepoint_vars', '<f8'))
+
+# Top-level Krun keys which are stored per-pexec, rather than in runs.extra.
+_PER_PEXEC_KEYS = (set(['wallclock_times', 'core_cycle_counts', 'classifications']) |
+                   set(name for name, _ in _PACKED_ANNOTATIONS))
+
+
+def _pack(values, dtype):
+    return sqlite3.Binary(numpy.asarray(values, dtype=dtype).tobytes())
+
+
+def _unpack(blob, dtype):
+    return numpy.frombuffer(bytes(blob), dtype=dtype)
+
+
+def connect(db_path, create=False):
+    """Open a results database, creating its tables if create is True."""
+
+    if not create:
+        assert os.path.exists(db_path), 'Database %s does not exist.' % db_path
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    if create:
+        conn.executescript(_SCHEMA)
+    return conn
+
+
+def ingest_krun_file(conn, filename, run_date=None):
+    """Store the contents of a Krun results file (with or without outlier and
+    changepoint annotations) as a new run. Returns a pair (run id, new) where
+    new is False if the same file had already been ingested.
+
+    If run_date (a string in DATE_FORMAT) is not given, the modification time
+    of filename is used.
+    """
+
+    assert os.path.exists(filename), 'File %s does not exist.' % filename
+    with open(filename, 'rb') as fd:
+        sha1 = hashlib.sha1(fd.read()).hexdigest()
+    row = conn.execute('SELECT id FROM runs WHERE sha1 = ?', (sha1,)).fetchone()
+    if row is not None:
+        return row['id'], False
+    if run_date is None:
+        mtime = datetime.datetime.fromtimestamp(os.path.getmtime(filename))
+        run_date = mtime.strftime(DATE_FORMAT)
+    else:  # Normalise the date, so that runs sort correctly.
+        run_date = datetime.datetime.strptime(run_date, DATE_FORMAT).strftime(DATE_FORMAT)
+    data = read_krun_results_file(filename)
+    pexec_keys = sorted(key for key in data if key in _PER_PEXEC_KEYS)
+    extra = dict((key, data[key]) for key in data if key not in _PER_PEXEC_KEYS)
+    now = datetime.datetime.now().strftime(DATE_FORMAT)
+    with conn:
+        cursor = conn.execute('INSERT INTO runs (filename, sha1, machine, run_date, '
+                              'ingest_date, pexec_keys, extra) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (os.path.basename(filename), sha1, get_machine_name(data),
+                               run_date, now, json.dumps(pexec_keys), json.dumps(extra)))
+        run_id = cursor.lastrowid
+        for key in sorted(data['wallclock_times']):
+            bench, vm, variant = key.split(':')
+            cursor = conn.execute('INSERT INTO benchmarks (run_id, benchmark, vm, variant) '
+                                  'VALUES (?, ?, ?, ?)', (run_id, bench, vm, variant))
+            benchmark_id = cursor.lastrowid
+            for pexec, wallclock_times in enumerate(data['wallclock_times'][key]):
+                row = {'benchmark_id': benchmark_id, 'pexec': pexec,
+                       'wallclock_times': _pack(wallclock_times, '<f8'),
+                       'num_cores': None, 'core_cycle_counts': None,
+                       'classification': None}
+                if 'core_cycle_counts' in data and key in data['core_cycle_counts']:
+                    cycles = data['core_cycle_counts'][key][pexec]
+                    if cycles is not None:  # CSV conversions have no cycle counts.
+                        row['num_cores'] = len(cycles)
+                        row['core_cycle_counts'] = _pack(cycles, '<i8')
+                for name, dtype in _PACKED_ANNOTATIONS:
+                    row[name] = None
+                    if name in data and key in data[name]:
+                        row[name] = _pack(data[name][key][pexec], dtype)
+                if 'classifications' in data and key in data['classifications']:
+                    row['classification'] = data['classifications'][key][pexec]
+                columns = sorted(row)
+                conn.execute('INSERT INTO pexecs (%s) VALUES (%s)' %
+                             (', '.join(columns), ', '.join('?' * len(columns))),
+                             [row[column] for column in columns])
+    return run_id, True
+
+
+def _where(clauses, params, column, value):
+    if value is not None:
+        clauses.append('%s = ?' % column)
+        params.append(value)
+
+
+def find_runs(conn, machine=None, benchmark=None, vm=None, variant=None,
+              since=None, until=None, last=None):
+    """Return runs, oldest first, matching all of the given criteria. since
+    and until are inclusive dates in DATE_FORMAT (or a prefix of it, e.g.
+    '2017-06'). If last is given, only the most recent last runs are returned.
+    Each run is a dictionary with keys id, machine, run_date and filename.
+    """
+
+    clauses, params = list(), list()
+    _where(clauses, params, 'runs.machine', machine)
+    _where(clauses, params, 'benchmarks.benchmark', benchmark)
+    _where(clauses, params, 'benchmarks.vm', vm)
+    _where(clauses, params, 'benchmarks.variant', variant)
+    if since is not None:
+        clauses.append('runs.run_date >= ?')
+        params.append(since)
+    if until is not None:
+        # Dates may be prefixes, so compare against the last possible date
+        # with that prefix.
+        clauses.append('runs.run_date <= ?')
+        params.append(until + u'\uffff')
+    query = ('SELECT DISTINCT runs.id, runs.machine, runs.run_date, runs.filename '
+             'FROM runs JOIN benchmarks ON benchmarks.run_id = runs.id')
+    if clauses:
+        query += ' WHERE ' + ' AND '.join(clauses)
+    query += ' ORDER BY runs.run_date DESC, runs.id DESC'
+    if last is not None:
+        query += ' LIMIT %d' % last
+    runs = [dict(row) for row in conn.execute(query, params)]
+    runs.reverse()
+    return runs
+
+
+def get_run(conn, run_id):
+    """Return a dictionary describing one run, or None if no such run exists.
+    The pexec_keys entry lists the per-pexec data stored for the run, e.g.
+    'changepoints' if the run was annotated by mark_changepoints_in_json.
+    """
+
+    row = conn.execute('SELECT id, machine, run_date, filename, pexec_keys FROM runs '
+                       'WHERE id = ?', (run_id,)).fetchone()
+    if row is None:
+        return None
+    run = dict(row)
+    run['pexec_keys'] = json.loads(run['pexec_keys'])
+    return run
+
+
+def read_run_index(conn, run_id):
+    """Return a pair (data, lengths) describing one run, without unpacking
+    any iteration data. data is in the same format as read_krun_results_file(),
+    except that the only per-pexec data it holds is classifications (if the
+    run has any). lengths maps each bench:vm:variant key to a list of the
+    number of in-process iterations in each pexec.
+    """
+
+    run = conn.execute('SELECT extra, pexec_keys FROM runs WHERE id = ?', (run_id,)).fetchone()
+    assert run is not None, 'No run with id %s in database.' % run_id
+    data = json.loads(run['extra'])
+    if 'classifications' in json.loads(run['pexec_keys']):
+        data['classifications'] = dict()
+    lengths = dict()
+    query = ('SELECT benchmarks.benchmark, benchmarks.vm, benchmarks.variant, '
+             'pexecs.pexec, LENGTH(pexecs.wallclock_times) AS size, pexecs.classification '
+             'FROM benchmarks LEFT JOIN pexecs ON pexecs.benchmark_id = benchmarks.id '
+             'WHERE benchmarks.run_id = ? ORDER BY benchmarks.id, pexecs.pexec')
+    for row in conn.execute(query, (run_id,)):
+        key = '%s:%s:%s' % (row['benchmark'], row['vm'], row['variant'])
+        if key not in lengths:
+            lengths[key] = list()
+            if 'classifications' in data:
+                data['classifications'][key] = list()
+        if row['pexec'] is None:
+            continue  # No pexecs for this benchmark.
+        lengths[key].append(row['size'] // numpy.dtype('<f8').itemsize)
+        if 'classifications' in data:
+            data['classifications'][key].append(row['classification'])
+    return data, lengths
+
+
+def read_run(conn, run_id, benchmark=None, vm=None, variant=None):
+    """Return the data for one run in the same format as
+    read_krun_results_file(). If any of benchmark, vm or variant are given,
+    only matching bench:vm:variant keys are included.
+    """
+
+    run = conn.execute('SELECT * FROM runs WHERE id = ?', (run_id,)).fetchone()
+    assert run is not None, 'No run with id %s in database.' % run_id
+    data = json.loads(run['extra'])
+    pexec_keys = json.loads(run['pexec_keys'])
+    for name in pexec_keys:
+        data[name] = dict()
+    clauses, params = ['benchmarks.run_id = ?'], [run_id]
+    _where(clauses, params, 'benchmarks.benchmark', benchmark)
+    _where(clauses, params, 'benchmarks.vm', vm)
+    _where(clauses, params, 'benchmarks.variant', variant)
+    query = ('SELECT benchmarks.id, benchmarks.benchmark, benchmarks.vm, benchmarks.variant '
+             'FROM benchmarks WHERE ' + ' AND '.join(clauses))
+    for bench_row in conn.execute(query, params).fetchall():
+        key = '%s:%s:%s' % (bench_row['benchmark'], bench_row['vm'], bench_row['variant'])
+        for name in pexec_keys:
+            data[name][key] = list()
+        pexecs = conn.execute('SELECT * FROM pexecs WHERE benchmark_id = ? ORDER BY pexec',
+                              (bench_row['id'],))
+        for row in pexecs:
+            data['wallclock_times'][key].append(_unpack(row['wallclock_times'], '<f8').tolist())
+            if 'core_cycle_counts' in pexec_keys:
+                if row['core_cycle_counts'] is None:
+                    data['core_cycle_counts'][key].append(None)
+                elif row['num_cores'] == 0:
+                    data['core_cycle_counts'][key].append(list())
+                else:
+                    cycles = _unpack(row['core_cycle_counts'], '<i8')
+                    data['core_cycle_counts'][key].append(cycles.reshape(row['num_cores'], -1).tolist())
+            for name, dtype in _PACKED_ANNOTATIONS:
+                if name in pexec_keys:
+                    if row[name] is None:  # No annotation for this key.
+                        data[name][key].append(None)
+                    else:
+                        data[name][key].append(_unpack(row[name], dtype).tolist())
+            if 'classifications' in pexec_keys:
+                data['classifications'][key].append(row['classification'])
+    return data
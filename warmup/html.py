@@ -35,58 +35,31 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import base64
 import math
 import numpy
 
 
-def html_histogram(data, nth):
-    """HTML version of the LaTeX Sparkline histograms."""
+def html_histogram_data(data):
+    """Return a histogram of data as a list of 10 normalised bin heights,
+    followed by the index of the bin containing the median. This is the
+    format expected by the renderer in HTML_HISTOGRAMS.
+    """
+
     histogram, bin_edges = numpy.histogram(data, bins=10)
     total = math.fsum(histogram)
     median_index = int(math.floor(len(data) / 2.0))
     cum_freq = 0  # Cumulative frequency.
-    normed = [value / total for value in histogram]
+    normed = [round(value / total, 3) for value in histogram]
     for index, bin_value in enumerate(histogram):
         cum_freq += bin_value
         if cum_freq >= median_index:
             median_bin_index = index
             break
-    data_s = "[ ['bin', 'value', { role: 'style' } ],\n"
-    for index, value in enumerate(normed):
-        colour = 'black'
-        if index == median_bin_index:
-            colour = 'red'
-        data_s += "['%d', %.3f, '%s'], " % (index, value, colour)
-    data_s += "]"
-    return """
-<script type="text/javascript">
-google.charts.setOnLoadCallback(draw_chart%d);
-function draw_chart%d() {
-    var data = google.visualization.arrayToDataTable(%s);
-    var view = new google.visualization.DataView(data);
-    var options = { width: 100,
-                    height: 70,
-                    bars: 'vertical',
-                    legend: { position: 'none' },
-                    backgroundColor: 'transparent',
-                    hAxis: { title: '',
-                             gridlines: { count: 0 },
-                             textPosition: 'none',
-                           },
-                    vAxis: { title: '',
-                             viewWindowMode: 'explicit',
-                             viewWindow: { min: 0.0, max: 1.1, },
-                             gridlines: { count: 0 },
-                             textPosition: 'none',
-                           },
-                  };
-    var chart = new google.visualization.ColumnChart(document.getElementById("bar%d"));
-    chart.draw(view, options);}
-</script>
-""" % (nth, nth, data_s, nth)
+    return normed + [median_bin_index]
 
 
-HTML_TABLE_TEMPLATE = """<h2>Results for %s</h2>
+HTML_TABLE_HEADER = """<h2>Results for %s</h2>
 <table>
 <tr>
 <th>Benchmark</th>
@@ -95,12 +68,10 @@ HTML_TABLE_TEMPLATE = """<h2>Results for %s</h2>
 <th>Steady iteration (s)</th>
 <th>Steady performance (s)</th>
 </tr>
-%s
-</table>
-"""  # VM name, table rows.
+"""  # VM name. Followed by table rows and HTML_TABLE_FOOTER.
 
 
-HTML_DIFF_TABLE_TEMPLATE = """<h2>Results for %s</h2>
+HTML_DIFF_TABLE_HEADER = """<h2>Results for %s</h2>
 <table>
 <tr>
 <th>Benchmark</th>
@@ -111,12 +82,15 @@ HTML_DIFF_TABLE_TEMPLATE = """<h2>Results for %s</h2>
 <th>Steady performance (s)</th>
 <th>Steady performance variation (s)</th>
 </tr>
-%s
+"""  # VM name. Followed by table rows and HTML_TABLE_FOOTER.
+
+
+HTML_TABLE_FOOTER = """
 </table>
-"""  # VM name, table rows.
+"""
 
 
-HTML_PAGE_TEMPLATE = """<html>
+HTML_PAGE_HEADER = """<html>
 <head>
 <title>Benchmark results</title>
 <style>
@@ -199,10 +173,6 @@ tr:nth-child(even) {
 #lightyellow { background-color: #e8e58a; }
 #lightgreen { background-color: #8ae89c; }
 </style>
-<script type="text/javascript" src="https://www.gstatic.com/charts/loader.js"></script>
-<script type="text/javascript">
-google.charts.load('current', {'packages':['corechart']});
-</script>
 </head>
 <body>
 <h1>Benchmark results</h1>
@@ -215,10 +185,274 @@ google.charts.load('current', {'packages':['corechart']});
 <canvas class="slowdown" width="10" height="10">slowdown</canvas> slowdown,
 <canvas class="warmup" width="10" height="10">warmup</canvas> warmup.
 </p>
-%s
+"""
+
+
+HTML_PAGE_FOOTER = """
 </body>
 </html>
-"""  # Strings from HTML_TABLE_TEMPLATE.
+"""
+
+
+HTML_PAGE_TEMPLATE = HTML_PAGE_HEADER + '%s' + HTML_PAGE_FOOTER  # Page contents.
+
+
+HTML_HISTOGRAMS = """
+<script type="application/json" id="histogram-data">%s</script>
+<script type="text/javascript">
+// Histogram n is drawn into the element with id "bar<n>". Each histogram is a
+// list of 10 bin heights (normalised to sum to 1), followed by the index of
+// the bin containing the median, which is drawn in red. Histograms are only
+// drawn when they are scrolled into view.
+var histograms = JSON.parse(document.getElementById("histogram-data").textContent);
+
+function draw_histogram(div) {
+  var data = histograms[parseInt(div.id.substring(3), 10)];
+  var canvas = document.createElement("canvas");
+  canvas.width = 100;
+  canvas.height = 70;
+  div.appendChild(canvas);
+  var ctx = canvas.getContext("2d"), bar_width = canvas.width / 10;
+  for (var i = 0; i < 10; i++) {
+    var height = data[i] / 1.1 * canvas.height;
+    ctx.fillStyle = i === data[10] ? "red" : "black";
+    ctx.fillRect(i * bar_width + 1, canvas.height - height, bar_width - 2, height);
+  }
+}
+
+(function () {
+  var divs = document.getElementsByClassName("histogram"), pending = [];
+  for (var i = 0; i < divs.length; i++) {
+    if (/^bar[0-9]+$/.test(divs[i].id)) { pending.push(divs[i]); }
+  }
+  if ("IntersectionObserver" in window) {
+    var observer = new IntersectionObserver(function (entries) {
+      for (var i = 0; i < entries.length; i++) {
+        if (entries[i].isIntersecting) {
+          observer.unobserve(entries[i].target);
+          draw_histogram(entries[i].target);
+        }
+      }
+    }, {rootMargin: "500px"});
+    for (var i = 0; i < pending.length; i++) { observer.observe(pending[i]); }
+  } else {  // Old browsers: draw everything up front.
+    for (var i = 0; i < pending.length; i++) { draw_histogram(pending[i]); }
+  }
+})();
+</script>
+"""  # JSON list of histograms, see html_histogram_data().
+
+
+HTML_VIRTUAL_TABLE_TEMPLATE = """
+<style>
+#viewport {
+  height: 80vh;
+  overflow-y: auto;
+}
+#virtual-table th {
+  position: sticky;
+  top: 0;
+  cursor: pointer;
+}
+#virtual-table th.sorted-up:after { content: " \\25B2"; }
+#virtual-table th.sorted-down:after { content: " \\25BC"; }
+#virtual-rows td { white-space: nowrap; }
+#virtual-rows tr:nth-child(even) { background-color: transparent; }
+#virtual-rows tr.shaded { background-color: #f2f2f2; }
+</style>
+<p>
+VM: <select id="filter-vm"><option value="">all</option></select>
+Classification: <select id="filter-classification"><option value="">all</option></select>
+Benchmark: <input type="text" id="filter-benchmark">
+<span id="row-count"></span>
+</p>
+<div id="viewport">
+<table id="virtual-table">
+<thead>
+<tr>
+<th data-column="1">Benchmark</th>
+<th data-column="0">VM</th>
+<th data-column="2">Classification</th>
+<th data-column="4">Steady iteration (&#35;)</th>
+<th data-column="8">Steady iteration (s)</th>
+<th data-column="12">Steady performance (s)</th>
+</tr>
+</thead>
+<tbody id="virtual-rows"></tbody>
+</table>
+</div>
+<script type="application/json" id="table-data">%s</script>
+<script type="text/javascript">
+// The table data is {"vms": [VM names], "rows": [rows]}, where each row is:
+//   [VM index, benchmark, classification, [[classification, count], ...],
+//    steady iteration, IQR low, IQR high, histogram index,
+//    steady iteration (s), IQR low, IQR high, histogram index,
+//    steady performance (s), confidence interval, histogram index]
+// Statistics are null if no steady state was reached. Only the rows in (or
+// near) the viewport are turned into HTML.
+var VM = 0, BENCHMARK = 1, CLASSIFICATION = 2, DETAIL = 3, ITER = 4,
+    TIME_TO_REACH = 8, PERF = 12;
+var BUFFER = 10;  // Rows drawn above and below the viewport.
+var table = JSON.parse(document.getElementById("table-data").textContent);
+var viewport = document.getElementById("viewport");
+var tbody = document.getElementById("virtual-rows");
+var filter_vm = document.getElementById("filter-vm");
+var filter_classification = document.getElementById("filter-classification");
+var filter_benchmark = document.getElementById("filter-benchmark");
+var rows = table.rows, row_height = null, sort_column = null, sort_order = 1;
+
+function escape_html(text) {
+  return String(text).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+}
+
+function symbol(classification) {
+  return '<canvas class="' + classification.replace(/ /g, "") +
+         '" width="10" height="10">' + classification + '</canvas>';
+}
+
+function classification_html(row) {  // See html_classification().
+  var detail = row[DETAIL], total = 0, count = 0, counts = [];
+  for (var i = 0; i < detail.length; i++) {
+    total += detail[i][1];
+    if (detail[i][0] === row[CLASSIFICATION]) { count = detail[i][1]; }
+    counts.push(detail[i][1] + " " + symbol(detail[i][0]));
+  }
+  if (row[CLASSIFICATION].indexOf("inconsistent") !== -1) {
+    return symbol(row[CLASSIFICATION]) + " (" + counts.join(", ") + ")";
+  } else if (count === total) {
+    return symbol(row[CLASSIFICATION]);
+  }
+  return " " + symbol(row[CLASSIFICATION]) + " " + count;
+}
+
+function statistic_html(histogram, align, text) {
+  return '<td style="text-align: ' + align + ';"><div id="bar' + histogram +
+         '" class="histogram"></div><div class="wrapper"><div class="td' + align + '">' +
+         text + '</div></div></td>';
+}
+
+function row_html(row, index) {
+  var html = '<tr' + (index & 1 ? ' class="shaded"' : '') + '><td>' + escape_html(row[BENCHMARK]) +
+             '</td><td>' + escape_html(table.vms[row[VM]]) + '</td><td>' +
+             classification_html(row) + '</td>';
+  if (row[ITER] === null) {
+    html += '<td></td>';
+  } else {
+    html += statistic_html(row[ITER + 3], "center", row[ITER].toFixed(1) + "<br/><small>(" +
+                           row[ITER + 1].toFixed(1) + ", " + row[ITER + 2].toFixed(1) + ")</small>");
+  }
+  if (row[TIME_TO_REACH] === null) {
+    html += '<td></td>';
+  } else {
+    html += statistic_html(row[TIME_TO_REACH + 3], "center", row[TIME_TO_REACH].toFixed(3) +
+                           "<br/><small>(" + row[TIME_TO_REACH + 1].toFixed(3) + ", " +
+                           row[TIME_TO_REACH + 2].toFixed(3) + ")</small>");
+  }
+  if (row[PERF] === null) {
+    html += '<td></td>';
+  } else {
+    html += statistic_html(row[PERF + 2], "right", row[PERF].toFixed(5) + "<br/><small>&plusmn;" +
+                           row[PERF + 1].toFixed(6) + "</small>");
+  }
+  return html + '</tr>';
+}
+
+function render() {
+  var height = row_height || 70;
+  var first = Math.max(0, Math.floor(viewport.scrollTop / height) - BUFFER);
+  var last = Math.min(rows.length, first + Math.ceil(viewport.clientHeight / height) + 2 * BUFFER);
+  var html = ['<tr style="height: ' + first * height + 'px;"></tr>'];
+  for (var i = first; i < last; i++) {
+    html.push(row_html(rows[i], i));
+  }
+  html.push('<tr style="height: ' + (rows.length - last) * height + 'px;"></tr>');
+  tbody.innerHTML = html.join("");
+  draw_symbols(tbody);
+  var divs = tbody.getElementsByClassName("histogram");
+  for (var i = 0; i < divs.length; i++) {
+    draw_histogram(divs[i]);
+  }
+  if (row_height === null && last > first) {
+    row_height = tbody.rows[1].offsetHeight || 70;  // Measure once.
+    render();
+  }
+}
+
+function compare(a, b) {
+  var x = a[sort_column], y = b[sort_column];
+  if (sort_column === VM) {
+    x = table.vms[x];
+    y = table.vms[y];
+  }
+  if (x === y) { return 0; }
+  if (x === null) { return 1; }  // Missing statistics always sort last.
+  if (y === null) { return -1; }
+  return (x < y ? -1 : 1) * sort_order;
+}
+
+function update() {
+  var vm = filter_vm.value, classification = filter_classification.value;
+  var benchmark = filter_benchmark.value.toLowerCase();
+  rows = [];
+  for (var i = 0; i < table.rows.length; i++) {
+    var row = table.rows[i];
+    if ((vm === "" || row[VM] === parseInt(vm, 10)) &&
+        (classification === "" || row[CLASSIFICATION] === classification) &&
+        (benchmark === "" || row[BENCHMARK].toLowerCase().indexOf(benchmark) !== -1)) {
+      rows.push(row);
+    }
+  }
+  if (sort_column !== null) {
+    rows.sort(compare);
+  }
+  document.getElementById("row-count").textContent = rows.length + " of " + table.rows.length + " rows.";
+  viewport.scrollTop = 0;
+  render();
+}
+
+(function () {
+  var classifications = {};
+  for (var i = 0; i < table.vms.length; i++) {
+    filter_vm.add(new Option(table.vms[i], String(i)));
+  }
+  for (var i = 0; i < table.rows.length; i++) {
+    classifications[table.rows[i][CLASSIFICATION]] = true;
+  }
+  var names = Object.keys(classifications).sort();
+  for (var i = 0; i < names.length; i++) {
+    filter_classification.add(new Option(names[i], names[i]));
+  }
+  filter_vm.onchange = filter_classification.onchange = filter_benchmark.oninput = update;
+  var headings = document.getElementById("virtual-table").getElementsByTagName("th");
+  for (var i = 0; i < headings.length; i++) {
+    headings[i].onclick = function () {
+      var column = parseInt(this.getAttribute("data-column"), 10);
+      sort_order = column === sort_column ? -sort_order : 1;
+      sort_column = column;
+      for (var j = 0; j < headings.length; j++) { headings[j].className = ""; }
+      this.className = sort_order === 1 ? "sorted-up" : "sorted-down";
+      update();
+    };
+  }
+  var scheduled = false;
+  viewport.onscroll = function () {
+    if (!scheduled) {
+      scheduled = true;
+      var callback = function () {
+        scheduled = false;
+        render();
+      };
+      if (window.requestAnimationFrame) {
+        window.requestAnimationFrame(callback);
+      } else {
+        setTimeout(callback, 0);
+      }
+    }
+  };
+  update();
+})();
+</script>
+"""  # JSON table data, see write_html_virtual_table().
 
 
 DIFF_LEGEND = """
@@ -232,6 +466,29 @@ DIFF_LEGEND = """
 """
 
 
+HTML_VM_MATRIX_TEMPLATE = """<h2>%s</h2>
+<table>
+<tr>
+<th></th>
+%s
+</tr>
+%s
+</table>
+"""  # Benchmark name, VM headings, table rows.
+
+
+VM_MATRIX_LEGEND = """
+<p>
+<strong>Each cell shows the steady state performance of the column VM divided by
+that of the row VM:</strong>
+<span id="lightgreen">row VM faster</span>
+<span id="lightred">row VM slower</span>
+<span>confidence intervals overlap.</span>
+Blank cells indicate that a VM did not reach a steady state.
+</p>
+"""
+
+
 _CANVAS_SYMBOLS = {
     'bad inconsistent': '<canvas class="badinconsistent" width="10" height="10">bad inconsistent</canvas>',
     'flat': '<canvas class="flat" width="10" height="10">flat</canvas>',
@@ -252,71 +509,204 @@ def get_symbol(symbol):
 
 HTML_SYMBOLS = """
 <script type="text/javascript">
-// Warmup.
-var c = document.getElementsByClassName("warmup");
-var i;
-for (i = 0; i < c.length; i++) {
-  var ctx = c[i].getContext("2d");
-  ctx.moveTo(0, 1);
-  ctx.lineTo(5, 1);
-  ctx.lineTo(5, 10);
-  ctx.lineTo(10, 10);
-  ctx.stroke();
+// Each classification symbol is a list of lines, each a list of (x, y) points.
+var SYMBOL_PATHS = {
+  "warmup": [[[0, 1], [5, 1], [5, 10], [10, 10]]],
+  "flat": [[[0, 7], [10, 7]]],
+  "slowdown": [[[0, 10], [5, 10], [5, 1], [10, 1]]],
+  "nosteadystate": [[[0, 6], [1, 3], [3, 10], [5, 3], [7, 10], [8, 3], [10, 6]]],
+  "goodinconsistent": [[[1, 5], [9, 5]], [[1, 8], [9, 8]]],
+  "badinconsistent": [[[1, 5], [9, 5]], [[1, 8], [9, 8]], [[1, 3], [9, 10]], [[1, 10], [9, 3]]]
+};
+
+// Draw every classification symbol (see get_symbol()) inside root.
+function draw_symbols(root) {
+  for (var name in SYMBOL_PATHS) {
+    var c = root.getElementsByClassName(name);
+    for (var i = 0; i < c.length; i++) {
+      var ctx = c[i].getContext("2d");
+      for (var j = 0; j < SYMBOL_PATHS[name].length; j++) {
+        var path = SYMBOL_PATHS[name][j];
+        ctx.moveTo(path[0][0], path[0][1]);
+        for (var k = 1; k < path.length; k++) {
+          ctx.lineTo(path[k][0], path[k][1]);
+        }
+      }
+      ctx.stroke();
+    }
+  }
 }
-// Flat.
-c = document.getElementsByClassName("flat");
-for (i = 0; i < c.length; i++) {
-  var ctx = c[i].getContext("2d");
-  ctx.moveTo(0, 7);
-  ctx.lineTo(10, 7);
-  ctx.stroke();
+draw_symbols(document);
+</script>
+"""
+
+
+def html_packed_array(values, dtype):
+    """Return values as a base64 encoded, packed array of the given (numpy)
+    dtype, which HTML_PLOTS_TEMPLATE decodes into a JavaScript typed array.
+    """
+    return base64.b64encode(numpy.asarray(values, dtype=dtype).tobytes())
+
+
+HTML_PLOTS_TEMPLATE = """<html>
+<head>
+<title>Benchmark plots</title>
+<style>
+body {
+  background-color: white;
+  font-family: sans-serif;
+  font-size: 14px;
 }
-// Slowdown.
-c = document.getElementsByClassName("slowdown");
-for (i = 0; i < c.length; i++) {
-  var ctx = c[i].getContext("2d");
-  ctx.moveTo(0, 10);
-  ctx.lineTo(5, 10);
-  ctx.lineTo(5, 1);
-  ctx.lineTo(10, 1);
-  ctx.stroke();
+.page {
+  display: flex;
+  flex-wrap: wrap;
 }
-// No steady state.
-c = document.getElementsByClassName("nosteadystate");
-for (i = 0; i < c.length; i++) {
-  var ctx = c[i].getContext("2d");
-  ctx.moveTo(0, 6);
-  ctx.lineTo(1, 3);
-  ctx.lineTo(3, 10);
-  ctx.lineTo(5, 3);
-  ctx.lineTo(7, 10);
-  ctx.lineTo(8, 3);
-  ctx.lineTo(10, 6);
-  ctx.stroke();
+.plot {
+  margin: 5px;
 }
-// Good inconsisent
-c = document.getElementsByClassName("goodinconsistent");
-for (i = 0; i < c.length; i++) {
-  var ctx = c[i].getContext("2d");
-  ctx.moveTo(1, 5);
-  ctx.lineTo(9, 5);
-  ctx.moveTo(1, 8);
-  ctx.lineTo(9, 8);
-  ctx.stroke();
+.plot canvas {
+  border: 1px solid #cccccc;
+}
+</style>
+</head>
+<body>
+<h1>Benchmark plots</h1>
+<p>
+Grey lines show in-process iteration times, black lines show steady state
+iterations, red dots show outliers, and red dashed lines show changepoints and
+the mean of each segment between changepoints.
+</p>
+<div id="plots"></div>
+<script type="application/json" id="plot-data">%s</script>
+<script type="text/javascript">
+// Each process execution is stored as packed, base64 encoded arrays of
+// (possibly downsampled) iteration numbers (x) and times (y). Arrays are only
+// decoded, and plots only drawn, when they are scrolled into view.
+var WIDTH = 560, HEIGHT = 240, MARGIN_LEFT = 70, MARGIN_RIGHT = 10,
+    MARGIN_TOP = 10, MARGIN_BOTTOM = 20;
+var pages = JSON.parse(document.getElementById("plot-data").textContent);
+
+function decode(b64, type) {
+  var bytes = atob(b64), buffer = new Uint8Array(bytes.length);
+  for (var i = 0; i < bytes.length; i++) {
+    buffer[i] = bytes.charCodeAt(i);
+  }
+  return new type(buffer.buffer);
+}
+
+function find(xs, value) {  // Binary search for value in sorted array xs.
+  var lo = 0, hi = xs.length - 1;
+  while (lo < hi) {
+    var mid = (lo + hi) >> 1;
+    if (xs[mid] < value) { lo = mid + 1; } else { hi = mid; }
+  }
+  return lo;
 }
-// Bad inconsistent.
-c = document.getElementsByClassName("badinconsistent");
-for (i = 0; i < c.length; i++) {
-  var ctx = c[i].getContext("2d");
-  ctx.moveTo(1, 5);
-  ctx.lineTo(9, 5);
-  ctx.moveTo(1, 8);
-  ctx.lineTo(9, 8);
-  ctx.moveTo(1, 3);
-  ctx.lineTo(9, 10);
-  ctx.moveTo(1, 10);
-  ctx.lineTo(9, 3);
+
+function draw(canvas, page, pexec) {
+  var ctx = canvas.getContext("2d");
+  var xs = decode(pexec.x, Uint32Array), ys = decode(pexec.y, Float32Array);
+  var width = WIDTH - MARGIN_LEFT - MARGIN_RIGHT;
+  var height = HEIGHT - MARGIN_TOP - MARGIN_BOTTOM;
+  var y_min = page.y_range[0], y_max = page.y_range[1];
+  if (y_max <= y_min) { y_max = y_min + 1.0; }
+  function px(x) { return MARGIN_LEFT + x / Math.max(pexec.n - 1, 1) * width; }
+  function py(y) { return MARGIN_TOP + (1.0 - (y - y_min) / (y_max - y_min)) * height; }
+  // Iterations from steady_from onwards are drawn in black.
+  var steady_from = 0;
+  if (pexec.classification === "no steady state") {
+    steady_from = pexec.n;
+  } else if (pexec.classification !== "flat" && pexec.changepoints.length > 0) {
+    steady_from = pexec.changepoints[pexec.changepoints.length - 1];
+  }
+  var first_steady = find(xs, steady_from);
+  ctx.lineWidth = 1;
+  ctx.strokeStyle = "#999999";
+  ctx.beginPath();
+  ctx.moveTo(px(xs[0]), py(ys[0]));
+  for (var i = 1; i <= first_steady; i++) {
+    ctx.lineTo(px(xs[i]), py(ys[i]));
+  }
+  ctx.stroke();
+  ctx.strokeStyle = "#000000";
+  ctx.beginPath();
+  ctx.moveTo(px(xs[first_steady]), py(ys[first_steady]));
+  for (var i = first_steady + 1; i < xs.length; i++) {
+    ctx.lineTo(px(xs[i]), py(ys[i]));
+  }
+  ctx.stroke();
+  // Changepoints and segment means.
+  ctx.strokeStyle = "#ff0000";
+  ctx.setLineDash([4, 3]);
+  ctx.beginPath();
+  var segment_start = 0;
+  for (var i = 0; i < pexec.means.length; i++) {
+    var segment_end = i < pexec.changepoints.length ? pexec.changepoints[i] : pexec.n - 1;
+    ctx.moveTo(px(segment_start), py(pexec.means[i]));
+    ctx.lineTo(px(segment_end), py(pexec.means[i]));
+    if (i < pexec.changepoints.length) {
+      ctx.moveTo(px(segment_end), MARGIN_TOP);
+      ctx.lineTo(px(segment_end), MARGIN_TOP + height);
+    }
+    segment_start = segment_end;
+  }
   ctx.stroke();
+  ctx.setLineDash([]);
+  // Outliers.
+  ctx.fillStyle = "#ff0000";
+  for (var i = 0; i < pexec.outliers.length; i++) {
+    var index = find(xs, pexec.outliers[i]);
+    ctx.beginPath();
+    ctx.arc(px(xs[index]), py(ys[index]), 2, 0, 2 * Math.PI);
+    ctx.fill();
+  }
+  // Axis labels. Iterations are numbered from 1.
+  ctx.fillStyle = "#000000";
+  ctx.textAlign = "right";
+  ctx.fillText(y_max.toPrecision(5), MARGIN_LEFT - 4, MARGIN_TOP + 8);
+  ctx.fillText(y_min.toPrecision(5), MARGIN_LEFT - 4, MARGIN_TOP + height);
+  ctx.fillText(pexec.n, MARGIN_LEFT + width, HEIGHT - 4);
+  ctx.textAlign = "left";
+  ctx.fillText("1", MARGIN_LEFT, HEIGHT - 4);
+}
+
+var plots = document.getElementById("plots"), pending = [];
+for (var p = 0; p < pages.length; p++) {
+  var heading = document.createElement("h2");
+  heading.textContent = pages[p].title;
+  plots.appendChild(heading);
+  var div = document.createElement("div");
+  div.className = "page";
+  plots.appendChild(div);
+  for (var e = 0; e < pages[p].pexecs.length; e++) {
+    var plot = document.createElement("div"), title = document.createElement("div");
+    var canvas = document.createElement("canvas");
+    plot.className = "plot";
+    title.textContent = pages[p].pexecs[e].title;
+    canvas.width = WIDTH;
+    canvas.height = HEIGHT;
+    canvas.plot = [pages[p], pages[p].pexecs[e]];
+    plot.appendChild(title);
+    plot.appendChild(canvas);
+    div.appendChild(plot);
+    pending.push(canvas);
+  }
+}
+if ("IntersectionObserver" in window) {
+  var observer = new IntersectionObserver(function (entries) {
+    for (var i = 0; i < entries.length; i++) {
+      if (entries[i].isIntersecting) {
+        var canvas = entries[i].target;
+        observer.unobserve(canvas);
+        draw(canvas, canvas.plot[0], canvas.plot[1]);
+      }
+    }
+  }, {rootMargin: "500px"});
+  for (var i = 0; i < pending.length; i++) { observer.observe(pending[i]); }
+} else {  // Old browsers: draw everything up front.
+  for (var i = 0; i < pending.length; i++) { draw(pending[i], pending[i].plot[0], pending[i].plot[1]); }
 }
 </script>
-"""
+</body>
+</html>
+"""  # JSON list of pages, see write_html_plots() in bin/plot_krun_results.
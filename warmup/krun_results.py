@@ -39,6 +39,9 @@ import bz2
 import csv
 import json
 import os.path
+import re
+
+from contextlib import closing
 
 
 _MACHINES = {
@@ -113,6 +116,15 @@ def csv_to_krun_json(in_files, language, vm, uname):
         return header, new_filename
 
 
+def get_machine_name(data):
+    """Return the name of the machine which generated a Krun results file."""
+
+    machine_name = data['audit']['uname'].split(' ')[1]
+    if '.' in machine_name:  # Remove domain, if there is one.
+        machine_name = machine_name.split('.')[0]
+    return machine_name
+
+
 def pretty_print_machine(machine):
     if machine in _MACHINES:
         return _MACHINES[machine]
@@ -151,17 +163,34 @@ def copy_results(key, p_execs, from_results, to_results):
         to_results['common_outliers'][key].append(from_results['common_outliers'][key][p_exec])
 
 
-def parse_krun_file_with_changepoints(json_files):
+def _read_results(json_files, db=None):
+    """Yield the data in each of a list of Krun results files, or (if db is
+    the path to a results database) each of a list of run ids.
+    """
+
+    if db is None:
+        for filename in json_files:
+            assert os.path.exists(filename), 'File %s does not exist.' % filename
+            yield read_krun_results_file(filename)
+    else:
+        from warmup.db import connect, read_run
+        with closing(connect(db)) as conn:
+            for run_id in json_files:
+                yield read_run(conn, run_id)
+
+
+def parse_krun_file_with_changepoints(json_files, db=None):
+    """Read Krun results files which have been annotated with outliers and
+    changepoints. If db is the path to a results database (see warmup.db)
+    then json_files should contain run ids, rather than filenames.
+    """
+
     data_dictionary = dict()
     classifier = None  # steady and delta values used by classifer.
     window_size = None
-    for filename in json_files:
-        assert os.path.exists(filename), 'File %s does not exist.' % filename
-        data = read_krun_results_file(filename)
+    for data in _read_results(json_files, db):
         assert 'classifications' in data, 'Please run mark_changepoints_in_json before re-running this script.'
-        machine_name = data['audit']['uname'].split(' ')[1]
-        if '.' in machine_name:  # Remove domain, if there is one.
-            machine_name = machine_name.split('.')[0]
+        machine_name = get_machine_name(data)
         if machine_name not in data_dictionary:
             data_dictionary[machine_name] = data
         else:  # We may have two datasets from the same machine.
@@ -202,6 +231,164 @@ def read_krun_results_file(results_file):
     return None
 
 
+# Number of bytes read at a time by stream_krun_results_file().
+_STREAM_CHUNK_SIZE = 1 << 20
+
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# Punctuation, strings and other scalars (numbers, true, false and null).
+_JSON_TOKEN = re.compile(r'[\[\]{},:]|"(?:[^"\\]|\\.)*"|[^\[\]{},:\s"]+')
+
+
+class _JSONStreamReader(object):
+    """Read JSON values, one at a time, from a file-like object, holding only
+    the current value (plus at most one chunk of input) in memory."""
+
+    def __init__(self, file_, chunk_size):
+        self.file_ = file_
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read(self, size):
+        """Discard consumed input and append size bytes to the buffer.
+        Returns False at the end of the file."""
+
+        data = self.file_.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character, or None at the end
+        of the file."""
+
+        while True:
+            self.pos = _JSON_WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._read(self.chunk_size):
+                return None
+
+    def expect(self, chars):
+        """Consume and return the next character, which must be in chars."""
+
+        char = self.peek()
+        assert char is not None and char in chars, \
+            'Malformed JSON: expected one of %s, got %s' % (chars, char)
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Consume and return the next JSON value."""
+
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except RuntimeError:
+                # Too deeply nested for the json module.
+                return self._nested_value()
+            except ValueError:
+                # The value may be truncated. Grow the buffer geometrically,
+                # so that large values are not decoded too many times.
+                if self.eof or not self._read(max(self.chunk_size, len(self.buf))):
+                    raise
+                continue
+            # A number may continue beyond the end of the buffer.
+            if end == len(self.buf) and not self.eof and self._read(self.chunk_size):
+                continue
+            self.pos = end
+            return value
+
+
+    def _nested_value(self):
+        """Consume and return the next JSON value, which may be nested to any
+        depth. This is much slower than value(), so is only used when the json
+        module exceeds Python's recursion limit."""
+
+        stack = list()  # Each entry is [array or object, pending object key].
+        while True:
+            assert self.peek() is not None, 'Malformed JSON: unexpected end of file'
+            match = _JSON_TOKEN.match(self.buf, self.pos)
+            # A token may continue beyond the end of the buffer.
+            while match is None or match.end() == len(self.buf):
+                if not self._read(self.chunk_size):
+                    break
+                match = _JSON_TOKEN.match(self.buf, self.pos)
+            assert match is not None, 'Malformed JSON at: %s' % self.buf[self.pos:self.pos + 20]
+            self.pos = match.end()
+            token = match.group()
+            if token == '[' or token == '{':
+                stack.append([list() if token == '[' else dict(), None])
+                continue
+            elif token == ',' or token == ':':
+                continue
+            elif token == ']' or token == '}':
+                value = stack.pop()[0]
+            else:
+                value = json.loads(token)
+            if not stack:
+                return value
+            container = stack[-1]
+            if isinstance(container[0], list):
+                container[0].append(value)
+            elif container[1] is None:
+                container[1] = value
+            else:
+                container[0][container[1]] = value
+                container[1] = None
+
+
+def stream_krun_results_file(results_file, callbacks, chunk_size=_STREAM_CHUNK_SIZE):
+    """Incrementally parse the JSON object stored in a Krun results file.
+    For each key in callbacks whose value is an array, callbacks[key] is called
+    on each element of the array in turn, and the array itself is never held
+    in memory. If the value is an object (e.g. wallclock_times),
+    callbacks[key] is called with the name and value of each of its members
+    in turn. Returns a dictionary of all other keys and their values.
+    """
+
+    results = dict()
+    with bz2.BZ2File(results_file, 'rb') as file_:
+        reader = _JSONStreamReader(file_, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return results
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            if key in callbacks and reader.peek() == '[':
+                reader.expect('[')
+                if reader.peek() == ']':
+                    reader.expect(']')
+                else:
+                    while True:
+                        callbacks[key](reader.value())
+                        if reader.expect(',]') == ']':
+                            break
+            elif key in callbacks and reader.peek() == '{':
+                reader.expect('{')
+                if reader.peek() == '}':
+                    reader.expect('}')
+                else:
+                    while True:
+                        name = reader.value()
+                        reader.expect(':')
+                        callbacks[key](name, reader.value())
+                        if reader.expect(',}') == '}':
+                            break
+            else:
+                results[key] = reader.value()
+            if reader.expect(',}') == '}':
+                return results
+
+
 def write_krun_results_file(results, filename):
     """Write a Krun results file to disk."""
 
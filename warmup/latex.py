@@ -35,14 +35,28 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import hashlib
 import math
 import numpy
+import os.path
+import re
+import subprocess
+import time
+
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
 _NUMBERS = {0:'zero', 1:'one', 2:'two', 3:'three', 4:'four', 5:'five',
             6:'six', 7:'seven', 8:'eight', 9:'nine'}
 
 _SPARKLINE_WIDTH = '4'  # Unit: ex.
 
+# pdflatex is run at most this many times on one document.
+MAX_LATEX_PASSES = 4
+
+# Messages in a pdflatex log which mean that another pass is needed.
+_RERUN_REGEX = re.compile('Rerun (LaTeX|to get)')
+
 STYLE_SYMBOLS = {  # Requires \usepackage{amssymb} and \usepackage{sparklines}
     'flat': '\\flatc',
     'no steady state': '\\nosteadystate',
@@ -258,6 +272,61 @@ def end_longtable():
     return __LATEX_END_LONGTABLE
 
 
+def _digest(filename):
+    """Return a digest of the contents of filename, or None if it does not
+    exist.
+    """
+
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as fd:
+        return hashlib.sha1(fd.read()).hexdigest()
+
+
+def compile_latex_document(tex_file, pdflatex_path):
+    """Compile tex_file to PDF with pdflatex, which writes its output into
+    the current working directory. pdflatex is only run again if the previous
+    pass changed the .aux file (which also holds longtable column widths) or
+    asked for a rerun, up to MAX_LATEX_PASSES times.
+
+    Returns a (number of passes, seconds taken) pair. Raises
+    subprocess.CalledProcessError if pdflatex fails.
+    """
+
+    jobname = os.path.splitext(os.path.basename(tex_file))[0]
+    cli = [pdflatex_path, '-interaction=batchmode', tex_file]
+    start = time.time()
+    passes = 0
+    while passes < MAX_LATEX_PASSES:
+        aux_digest = _digest(jobname + '.aux')
+        subprocess.check_output(cli)
+        passes += 1
+        with open(jobname + '.log') as fd:
+            rerun = _RERUN_REGEX.search(fd.read()) is not None
+        if not rerun and _digest(jobname + '.aux') == aux_digest:
+            break
+    return passes, time.time() - start
+
+
+def compile_latex(tex_files, pdflatex_path, jobs=None):
+    """Compile each of tex_files with compile_latex_document(), running up
+    to jobs (by default, the number of CPUs) copies of pdflatex at once.
+    Returns a list of (tex_file, number of passes, seconds taken) tuples.
+    """
+
+    jobnames = [os.path.splitext(os.path.basename(tex_file))[0] for tex_file in tex_files]
+    assert len(set(jobnames)) == len(jobnames), \
+        'Cannot compile LaTeX files with the same name concurrently.'
+    pool = ThreadPool(max(1, min(jobs or cpu_count(), len(tex_files))))
+    try:
+        results = pool.map(lambda tex_file: compile_latex_document(tex_file, pdflatex_path),
+                           tex_files)
+    finally:
+        pool.close()
+        pool.join()
+    return [(tex_file, passes, secs) for tex_file, (passes, secs) in zip(tex_files, results)]
+
+
 def escape(word):
     return word.replace('_', '\\_')
 
@@ -0,0 +1,163 @@
+# Copyright (c) 2018 King's College London
+# created by the Software Development Team <http://soft-dev.org/>
+#
+# The Universal Permissive License (UPL), Version 1.0
+#
+# Subject to the condition set forth below, permission is hereby granted to any
+# person obtaining a copy of this software, associated documentation and/or
+# data (collectively the "Software"), free of charge and under any and all
+# copyright rights in the Software, and any and all patent rights owned or
+# freely licensable by each licensor hereunder covering either (i) the
+# unmodified Software as contributed to or provided by such licensor, or (ii)
+# the Larger Works (as defined below), to deal in both
+#
+# (a) the Software, and
+# (b) any piece of software and/or hardware listed in the lrgrwrks.txt file if
+# one is included with the Software (each a "Larger Work" to which the Software
+# is contributed by such licensors),
+#
+# without restriction, including without limitation the rights to copy, create
+# derivative works of, display, perform, and distribute the Software and make,
+# use, sell, offer for sale, import, export, have made, and have sold the
+# Software and the Larger Work(s), and to sublicense the foregoing rights on
+# either these or other terms.
+#
+# This license is subject to the following condition: The above copyright
+# notice and either this complete permission notice or at a minimum a reference
+# to the UPL must be included in all copies or substantial portions of the
+# Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Simultaneous confidence intervals for multinomial proportions.
+
+This is a port of the multinomialCI() function from the MultinomialCI R
+package, which implements the method of:
+
+  C. P. Sison and J. Glaz. Simultaneous confidence intervals and sample size
+  determination for multinomial proportions. Journal of the American
+  Statistical Association, 90(429):366-369, 1995.
+
+The port follows the R code closely, so that results match those from R, but
+computes intervals for many sets of counts at once. Poisson CDFs are read from
+a table built from log-factorials, rather than being recomputed for each call.
+"""
+
+import math
+import numpy
+
+
+def _ppois_table(n):
+    """Return a table of Poisson CDFs, where table[lam, q] = ppois(q, lam) for
+    integer lam in [0, n] and q in [0, 2n].
+    """
+
+    q = numpy.arange(2 * n + 1)
+    log_factorial = numpy.concatenate(([0.0], numpy.cumsum(numpy.log(numpy.arange(1, 2 * n + 1)))))
+    lam = numpy.arange(1, n + 1)[:, numpy.newaxis]
+    pmf = numpy.exp(q * numpy.log(lam) - lam - log_factorial)
+    # A Poisson distribution with mean 0 has all of its mass at 0.
+    pmf = numpy.vstack(([1.0] + [0.0] * (2 * n), pmf))
+    return numpy.minimum(numpy.cumsum(pmf, axis=1), 1.0)
+
+
+def _ppois(table, q, lam):
+    """Look up ppois(q, lam) for arrays of integer q and lam. Negative q
+    have probability 0.
+    """
+
+    return numpy.where(q < 0, 0.0, table[lam, numpy.maximum(q, 0)])
+
+
+def _moments(table, c, lam):
+    """Return the first four central moments of Poisson distributions with
+    means lam, truncated to [lam - c, lam + c], and the probability mass in
+    that range. Results have the shape of lam, with a new final axis.
+    """
+
+    a = lam + c
+    b = numpy.maximum(lam - c, 0)
+    den = _ppois(table, a, lam) - _ppois(table, b - 1, lam)
+    mu = list()
+    for r in xrange(1, 5):
+        pois_a = _ppois(table, a, lam) - _ppois(table, a - r, lam)
+        pois_b = _ppois(table, b - 1, lam) - _ppois(table, b - r - 1, lam)
+        mu.append((lam ** r) * (1 - (pois_a - pois_b) / den))
+    mom1 = mu[0]
+    mom2 = mu[1] + mu[0] - mu[0] ** 2
+    mom3 = mu[2] + mu[1] * (3 - 3 * mu[0]) + (mu[0] - 3 * mu[0] ** 2 + 2 * mu[0] ** 3)
+    mom4 = (mu[3] + mu[2] * (6 - 4 * mu[0]) + mu[1] * (7 - 12 * mu[0] + 6 * mu[0] ** 2) +
+            mu[0] - 4 * mu[0] ** 2 + 6 * mu[0] ** 3 - 3 * mu[0] ** 4)
+    return numpy.stack((mom1, mom2, mom3, mom4, den), axis=-1)
+
+
+def _truncpoi(table, c, counts, n):
+    """Return the Edgeworth approximation of P(max |X_i - counts_i| <= c) for
+    each row of counts.
+    """
+
+    m = _moments(table, c, counts)
+    m[..., 3] -= 3 * m[..., 1] ** 2
+    s1, s2, s3, s4 = [m[..., j].sum(axis=-1) for j in xrange(4)]
+    probn = 1 / (table[n, n] - table[n, n - 1])
+    z = (n - s1) / numpy.sqrt(s2)
+    g1 = s3 / (s2 ** 1.5)
+    g2 = s4 / (s2 ** 2)
+    # MultinomialCI splits this expression over two lines, so R discards the
+    # g1 ** 2 term. We do the same, so that our results match.
+    poly = 1 + g1 * (z ** 3 - 3 * z) / 6 + g2 * (z ** 4 - 6 * z ** 2 + 3) / 24
+    f = poly * numpy.exp(-z ** 2 / 2) / math.sqrt(2 * math.pi)
+    probx = numpy.prod(m[..., 4], axis=-1)
+    return probn * probx * f / numpy.sqrt(s2)
+
+
+def _multinomial_ci_same_n(counts, n, alpha):
+    table = _ppois_table(n)
+    rows = counts.shape[0]
+    found = numpy.zeros(rows, dtype=bool)
+    c = numpy.zeros(rows, dtype=int)
+    p = numpy.zeros(rows)
+    pold = numpy.zeros(rows)
+    for cc in xrange(1, n + 1):
+        p_cc = _truncpoi(table, cc, counts, n)
+        hit = ~found & (p_cc > 1 - alpha) & (pold < 1 - alpha)
+        c[hit] = cc
+        found |= hit
+        p = numpy.where(found & ~hit, p, p_cc)
+        pold = numpy.where(found, pold, p_cc)
+        if found.all():
+            break
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        delta = (1 - alpha - pold) / (p - pold)
+    c = (c - 1)[:, numpy.newaxis]
+    delta = delta[:, numpy.newaxis]
+    obsp = counts / float(n)
+    lower = numpy.maximum(obsp - c / float(n), 0.0)
+    upper = numpy.minimum(obsp + c / float(n) + 2 * delta / n, 1.0)
+    return numpy.stack((lower, upper), axis=-1)
+
+
+def multinomial_ci(counts, alpha):
+    """Return Sison-Glaz simultaneous confidence intervals, at significance
+    level alpha, for each row of counts (a sequence of sequences of counts,
+    one count per category). Returns an array of shape
+    (len(counts), number of categories, 2) holding [lower, upper] bounds,
+    i.e. one array for each row, in the same format as R's multinomialCI().
+    """
+
+    counts = numpy.asarray(counts, dtype=int)
+    assert counts.ndim == 2, 'Expected a sequence of sequences of counts.'
+    totals = counts.sum(axis=1)
+    assert (totals > 0).all(), 'Cannot compute intervals for empty samples.'
+    intervals = numpy.zeros(counts.shape + (2,))
+    # All intervals for samples of the same size share a table of Poisson CDFs.
+    for n in numpy.unique(totals):
+        rows = totals == n
+        intervals[rows] = _multinomial_ci_same_n(counts[rows], int(n), alpha)
+    return intervals
@@ -39,7 +39,9 @@ import math
 import numpy
 import textwrap
 
-from matplotlib import pyplot
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
 from matplotlib.ticker import ScalarFormatter, FormatStrFormatter
 
 ZOOM_PERCENTILE_MIN = 10.0
@@ -53,6 +55,12 @@ BASE_FONTSIZE = 8
 
 MAX_INSTR_YLABEL_CHARS = 12
 
+# Line plots with more than DOWNSAMPLE_BUCKETS * 4 points are downsampled to
+# (at most) the first, last, minimum and maximum point of DOWNSAMPLE_BUCKETS
+# equally sized buckets. This is many more buckets than there are pixels
+# across a subplot, so the downsampled line looks the same as the original.
+DOWNSAMPLE_BUCKETS = 2000
+
 STYLE_DICT = {
     'figure.facecolor': 'white',
     'text.color': DARK_GRAY,
@@ -129,32 +137,41 @@ def axis_to_figure_transform(fig, axis, coord):
     return fig.transFigure.inverted().transform(axis.transAxes.transform(coord))
 
 
-def collide_rect((left, bottom, width, height), fig, axis, data, x_bounds):
-    """Determine whether a rectangle (in axis coordinates) collides with
-    any data (data coordinates, or seconds). We use the matplotlib transData
-    API to convert between display and data coordinates.
+def collide_rects(rects, axis, data, x_bounds):
+    """Determine whether each of a list of (left, bottom, width, height)
+    rectangles (in axis coordinates) collides with any data (data coordinates,
+    or seconds). An inset in the top half of the chart collides with any datum
+    inside or above it, and an inset in the bottom half with any datum inside
+    or below it, so only the highest and lowest datum under each rectangle
+    matter. Return two arrays: whether each rectangle collides, and (if not)
+    the distance between the rectangle and the nearest datum.
     """
-    # Find the values on the x-axis of left and right edges of the rect.
-    x_left_float, _ = axis_data_transform(axis, left, 0, inverse=False)
-    x_right_float, _ = axis_data_transform(axis, left + width, 0, inverse=False)
-    x_left = int(math.floor(x_left_float)) - x_bounds[0]
-    x_right = int(math.ceil(x_right_float)) - x_bounds[0]
-    # Next find the highest and lowest y-value in that segment of data.
-    minimum_y = min(data[x_left:x_right])
-    maximum_y = max(data[x_left:x_right])
-    # Next convert the bottom and top of the rect to data coordinates (seconds).
-    _, inset_top = axis_data_transform(axis, 0, bottom + height, inverse=False)
-    _, inset_bottom = axis_data_transform(axis, 0, bottom, inverse=False)
-    for datum in data[x_left:x_right]:
-        if ((datum >= inset_bottom and datum <= inset_top) or  # Inside rect.
-            (bottom > 0.5 and datum >= inset_top) or           # Above rect.
-            (bottom < 0.5 and datum <= inset_bottom)):         # Below rect.
-            return True, -1.0
-    if bottom > 0.5:  # Inset at top of chart.
-        dist = math.fabs(inset_bottom - maximum_y)
-    elif bottom < 0.5:  # Inset at bottom.
-        dist = math.fabs(inset_top - minimum_y)
-    return False, dist
+
+    data = numpy.asarray(data)
+    left, bottom, width, height = numpy.asarray(rects, dtype=float).T
+    # Find the values on the x-axis of left and right edges of each rect.
+    x_left_float, inset_bottom = axis_data_transform(axis, left, bottom, inverse=False)
+    x_right_float, inset_top = axis_data_transform(axis, left + width, bottom + height,
+                                                   inverse=False)
+    x_left = numpy.clip(numpy.floor(x_left_float).astype(int) - x_bounds[0], 0, len(data))
+    x_right = numpy.clip(numpy.ceil(x_right_float).astype(int) - x_bounds[0], 0, len(data))
+    # Split the data at the edge of every rect, and find the min and max of
+    # each split. Each rect covers a contiguous run of splits.
+    edges = numpy.unique(numpy.concatenate((x_left, x_right)))
+    starts = edges[edges < len(data)]
+    split_min = numpy.minimum.reduceat(data, starts)
+    split_max = numpy.maximum.reduceat(data, starts)
+    covered = ((starts[numpy.newaxis, :] >= x_left[:, numpy.newaxis]) &
+               (starts[numpy.newaxis, :] < x_right[:, numpy.newaxis]))
+    minimum_y = numpy.where(covered, split_min, numpy.inf).min(axis=1)
+    maximum_y = numpy.where(covered, split_max, -numpy.inf).max(axis=1)
+    at_top = bottom > 0.5
+    collides = numpy.where(at_top, maximum_y >= inset_bottom, minimum_y <= inset_top)
+    collides |= ~covered.any(axis=1)  # Rect is outside of the data.
+    dist = numpy.where(at_top, numpy.fabs(inset_bottom - maximum_y),
+                       numpy.fabs(inset_top - minimum_y))
+    dist[collides] = -1.0
+    return collides, dist
 
 
 def add_inset_to_axis(fig, axis, rect):
@@ -165,6 +182,26 @@ def add_inset_to_axis(fig, axis, rect):
     return fig.add_axes([fig_left, fig_bottom, fig_width, fig_height], frameon=True)
 
 
+def get_tick_labels(axis):
+    """Return the text of each major ticklabel on a matplotlib XAxis or
+    YAxis, and the axis' offset text, as they would be after the figure is
+    next drawn. This is much cheaper than calling pyplot.draw(), which draws
+    every axis on the figure, then reading back the ticklabels.
+    """
+    locs = axis.get_majorticklocs()
+    formatter = axis.get_major_formatter()
+    formatter.set_locs(locs)
+    # matplotlib only updates the ticklabels which are inside the view limits.
+    low, high = sorted(axis.get_view_interval())
+    labels = list()
+    for index, (loc, label) in enumerate(zip(locs, axis.get_majorticklabels())):
+        if low <= loc <= high:
+            labels.append(formatter(loc, index))
+        else:
+            labels.append(label.get_text())
+    return labels, formatter.get_offset()
+
+
 def format_yticks_scientific(axis):
     """Apply scientific formatting to y-axis of a given set of axes.
     Change from 'offset' notation (where a number is added / subtracted to each
@@ -181,11 +218,9 @@ def format_yticks_scientific(axis):
     else:
         formatter = FormatStrFormatter('%.5f')
         axis.yaxis.set_major_formatter(formatter)
-    pyplot.draw()
-    offset = axis.yaxis.get_offset_text().get_text()
+    labels, offset = get_tick_labels(axis.yaxis)
     if len(offset) > 0:
-        labels = [label.get_text() + offset for label in axis.get_yticklabels()]
-        axis.set_yticklabels(labels)
+        axis.set_yticklabels([label + offset for label in labels])
         axis.yaxis.offsetText.set_visible(False)
 
 
@@ -203,6 +238,73 @@ def get_unified_yrange(executions, xlimits_start, xlimits_stop, padding=0.02):
     return y_min, y_max
 
 
+def downsample_min_max(x_values, y_values, buckets=DOWNSAMPLE_BUCKETS, keep=None):
+    """Reduce the number of points in a line plot, retaining its visual extremes.
+    x_values must be sorted. Points are split into (at most) 'buckets' buckets,
+    and only the first, last, minimum and maximum point in each bucket are
+    kept, along with any point whose x-value is in 'keep' (e.g. outliers and
+    changepoints). Lines with fewer than buckets * 4 points are returned as-is.
+    """
+
+    x_values, y_values = numpy.asarray(x_values), numpy.asarray(y_values)
+    length = len(y_values)
+    if length <= buckets * 4:
+        return x_values, y_values
+    size = int(math.ceil(float(length) / buckets))
+    # Pad the last bucket with copies of the last value, so that all buckets
+    # are the same size and can be reduced in one operation.
+    n_buckets = int(math.ceil(float(length) / size))
+    padded = numpy.pad(y_values, (0, n_buckets * size - length), 'edge')
+    blocks = padded.reshape(n_buckets, size)
+    starts = numpy.arange(n_buckets) * size
+    indices = [starts,
+               numpy.minimum(starts + size, length) - 1,
+               numpy.minimum(starts + numpy.argmin(blocks, axis=1), length - 1),
+               numpy.minimum(starts + numpy.argmax(blocks, axis=1), length - 1)]
+    if keep is not None and len(keep) > 0:
+        indices.append(numpy.flatnonzero(numpy.in1d(x_values, keep)))
+    indices = numpy.unique(numpy.concatenate(indices))
+    return x_values[indices], y_values[indices]
+
+
+def rasterize_lines(axis, lines, dpi, zorder):
+    """Replace lines (Line2D objects plotted on axis) with a single image of
+    those lines, drawn at dpi and placed at zorder. Everything else on axis
+    (e.g. ticks, text and annotations) remains a vector graphic. This must be
+    called after the limits of axis are final.
+
+    matplotlib can rasterize individual artists, but (in PDFs) it renders each
+    one onto an image the size of the whole figure, which is very slow. Here,
+    the image is only the size of the axis.
+    """
+
+    fig = axis.figure
+    bbox = axis.get_window_extent()
+    raster_fig = Figure(figsize=(bbox.width / fig.dpi, bbox.height / fig.dpi), dpi=dpi)
+    canvas = FigureCanvasAgg(raster_fig)
+    raster_fig.patch.set_alpha(0.0)
+    raster_axis = raster_fig.add_axes([0, 0, 1, 1])
+    raster_axis.set_axis_off()
+    xlim, ylim = axis.get_xlim(), axis.get_ylim()
+    raster_axis.set_xlim(xlim)
+    raster_axis.set_ylim(ylim)
+    for line in lines:
+        raster_line = Line2D(*line.get_data())
+        raster_line.update_from(line)
+        raster_axis.add_line(raster_line)
+        raster_line.set_transform(raster_axis.transData)
+        raster_line.set_clip_path(raster_axis.patch)
+        line.remove()
+    canvas.draw()
+    width, height = canvas.get_width_height()
+    image = numpy.frombuffer(canvas.buffer_rgba(), dtype=numpy.uint8).reshape(height, width, 4)
+    axis.imshow(image, extent=(xlim[0], xlim[1], ylim[0], ylim[1]), aspect='auto',
+                interpolation='none', zorder=zorder)
+    # Do not let the image change the view limits.
+    axis.set_xlim(xlim)
+    axis.set_ylim(ylim)
+
+
 def add_margin_to_axes(axis, x=0.01, y=0.01):
     """Seaborn-friendly way to add margins to axes (default 1% margin).
     """
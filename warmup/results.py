@@ -0,0 +1,371 @@
+# Copyright (c) 2018 King's College London
+# created by the Software Development Team <http://soft-dev.org/>
+#
+# The Universal Permissive License (UPL), Version 1.0
+#
+# Subject to the condition set forth below, permission is hereby granted to any
+# person obtaining a copy of this software, associated documentation and/or
+# data (collectively the "Software"), free of charge and under any and all
+# copyright rights in the Software, and any and all patent rights owned or
+# freely licensable by each licensor hereunder covering either (i) the
+# unmodified Software as contributed to or provided by such licensor, or (ii)
+# the Larger Works (as defined below), to deal in both
+#
+# (a) the Software, and
+# (b) any piece of software and/or hardware listed in the lrgrwrks.txt file if
+# one is included with the Software (each a "Larger Work" to which the Software
+# is contributed by such licensors),
+#
+# without restriction, including without limitation the rights to copy, create
+# derivative works of, display, perform, and distribute the Software and make,
+# use, sell, offer for sale, import, export, have made, and have sold the
+# Software and the Larger Work(s), and to sublicense the foregoing rights on
+# either these or other terms.
+#
+# This license is subject to the following condition: The above copyright
+# notice and either this complete permission notice or at a minimum a reference
+# to the UPL must be included in all copies or substantial portions of the
+# Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Indexed, in-memory access to Krun results data.
+
+Krun results files store data in nested dictionaries, keyed on
+'bench:vm:variant' strings, with one list entry per process execution. A
+ResultSet stores one PExec record per process execution, with wallclock
+times held in numpy arrays, and indexes the records by machine, VM,
+benchmark, variant and pexec number.
+
+Filtering or renaming a ResultSet returns a new view on the same records, so
+neither operation copies or rescans the underlying data.
+"""
+
+import itertools
+import numpy
+
+from collections import OrderedDict
+from warmup.krun_results import get_machine_name, read_krun_results_file
+
+# Fields which can be used to filter and rename records.
+INDEXED_FIELDS = ('machine', 'benchmark', 'vm', 'variant', 'index')
+
+# Per-pexec annotations written by mark_outliers_in_json and
+# mark_changepoints_in_json. Note that Krun files store classifications
+# under a plural key.
+_ANNOTATIONS = (('all_outliers', 'all_outliers'),
+                ('common_outliers', 'common_outliers'),
+                ('unique_outliers', 'unique_outliers'),
+                ('changepoints', 'changepoints'),
+                ('changepoint_means', 'changepoint_means'),
+                ('changepoint_vars', 'changepoint_vars'),
+                ('classifications', 'classification'))
+
+
+class PExec(object):
+    """All data for a single process execution."""
+
+    __slots__ = ('machine', 'benchmark', 'vm', 'variant', 'index',
+                 'wallclock_times', 'core_cycle_counts', 'all_outliers',
+                 'common_outliers', 'unique_outliers', 'changepoints',
+                 'changepoint_means', 'changepoint_vars', 'classification')
+
+    def __init__(self, machine, benchmark, vm, variant, index, wallclock_times,
+                 core_cycle_counts=None, all_outliers=None, common_outliers=None,
+                 unique_outliers=None, changepoints=None, changepoint_means=None,
+                 changepoint_vars=None, classification=None):
+        self.machine = machine
+        self.benchmark = benchmark
+        self.vm = vm
+        self.variant = variant
+        self.index = index
+        self.wallclock_times = numpy.asarray(wallclock_times, dtype=numpy.float64)
+        self.core_cycle_counts = core_cycle_counts
+        self.all_outliers = all_outliers if all_outliers is not None else list()
+        self.common_outliers = common_outliers if common_outliers is not None else list()
+        self.unique_outliers = unique_outliers if unique_outliers is not None else list()
+        self.changepoints = changepoints
+        self.changepoint_means = changepoint_means
+        self.changepoint_vars = changepoint_vars
+        self.classification = classification
+
+    @property
+    def key(self):
+        return '%s:%s:%s' % (self.benchmark, self.vm, self.variant)
+
+    @property
+    def crashed(self):
+        return len(self.wallclock_times) == 0
+
+    def __repr__(self):
+        return '<PExec %s:%s:%d>' % (self.machine, self.key, self.index)
+
+
+class _Store(object):
+    """Records and indexes shared between a ResultSet and all of its views."""
+
+    __slots__ = ('records', 'indexes', 'keys', 'classifier', 'window_size',
+                 'audits')
+
+    def __init__(self):
+        self.records = list()
+        # field name -> value -> list of record indices.
+        self.indexes = dict((field, dict()) for field in INDEXED_FIELDS)
+        # (machine, bench, vm, variant) -> list of record indices, in pexec
+        # order. Benchmarks with no executions map to an empty list.
+        self.keys = OrderedDict()
+        self.classifier = None
+        self.window_size = None
+        self.audits = dict()  # machine -> Krun audit.
+
+    def add_key(self, machine, bench, vm, variant):
+        triplet = (machine, bench, vm, variant)
+        if triplet not in self.keys:
+            self.keys[triplet] = list()
+        return self.keys[triplet]
+
+    def add(self, record):
+        position = len(self.records)
+        self.records.append(record)
+        for field in INDEXED_FIELDS:
+            value = getattr(record, field)
+            if value not in self.indexes[field]:
+                self.indexes[field][value] = list()
+            self.indexes[field][value].append(position)
+        self.add_key(record.machine, record.benchmark, record.vm,
+                     record.variant).append(position)
+
+
+class ResultSet(object):
+    """A (possibly filtered or renamed) view on a set of PExec records.
+
+    Filters and renamings are expressed in terms of the names a view
+    presents, so a view can be filtered on a VM name it introduced by
+    renaming. Records are never copied: PExec objects always hold their
+    original names, and views translate names with display() and key_of().
+    """
+
+    __slots__ = ('_store', '_filters', '_renames')
+
+    def __init__(self, store=None, filters=None, renames=None):
+        self._store = store if store is not None else _Store()
+        self._filters = filters if filters is not None else dict()
+        self._renames = renames if renames is not None else dict()
+
+    @classmethod
+    def from_krun_data(cls, data, machine=None, store=None):
+        """Build a ResultSet from the dictionary stored in one Krun results
+        file. If a store is passed in, records are added to it.
+        """
+
+        if store is None:
+            store = _Store()
+        if machine is None:
+            machine = get_machine_name(data)
+        if 'classifier' in data:
+            if store.classifier is None:
+                store.classifier = data['classifier']
+            assert store.classifier == data['classifier'], \
+                ('Cannot summarise categories generated with different '
+                 'command-line options for steady-state-expected '
+                 'or delta. Please re-run the mark_changepoints_in_json script.')
+        if 'window_size' in data:
+            if store.window_size is None:
+                store.window_size = data['window_size']
+            assert store.window_size == data['window_size'], \
+                ('Cannot summarise categories generated with different window-size '
+                 'options. Please re-run the mark_outliers_in_json script.')
+        if 'audit' in data:
+            store.audits[machine] = data['audit']
+        for key in sorted(data['wallclock_times']):
+            bench, vm, variant = key.split(':')
+            assert (machine, bench, vm, variant) not in store.keys, \
+                'Found %s twice in data from %s.' % (key, machine)
+            store.add_key(machine, bench, vm, variant)
+            for index, wallclock_times in enumerate(data['wallclock_times'][key]):
+                kwargs = dict()
+                for outer_key, field in _ANNOTATIONS:
+                    if outer_key in data and key in data[outer_key]:
+                        kwargs[field] = data[outer_key][key][index]
+                if 'core_cycle_counts' in data and key in data['core_cycle_counts']:
+                    kwargs['core_cycle_counts'] = data['core_cycle_counts'][key][index]
+                store.add(PExec(machine, bench, vm, variant, index,
+                                wallclock_times, **kwargs))
+        return cls(store)
+
+    @classmethod
+    def from_data_dictionaries(cls, data_dictionaries):
+        """Build a ResultSet from a dictionary of machine -> Krun data, as
+        returned by parse_krun_file_with_changepoints().
+        """
+
+        store = _Store()
+        for machine in sorted(data_dictionaries):
+            cls.from_krun_data(data_dictionaries[machine], machine, store)
+        return cls(store)
+
+    @classmethod
+    def from_krun_files(cls, json_files):
+        store = _Store()
+        for filename in json_files:
+            cls.from_krun_data(read_krun_results_file(filename), store=store)
+        return cls(store)
+
+    @property
+    def classifier(self):
+        return self._store.classifier
+
+    @property
+    def window_size(self):
+        return self._store.window_size
+
+    @property
+    def audits(self):
+        return self._store.audits
+
+    def filter(self, **kwargs):
+        """Return a view containing only records whose fields match kwargs.
+        Each argument may be a single value or a list of acceptable values,
+        e.g. results.filter(vm='PyPy', benchmark=['fasta', 'nbody']).
+        """
+
+        filters = dict(self._filters)
+        for field, values in kwargs.iteritems():
+            assert field in INDEXED_FIELDS, 'Cannot filter on %s.' % field
+            if not isinstance(values, (list, tuple, set, frozenset)):
+                values = (values,)
+            wanted = set()
+            for value in values:
+                wanted.update(self._original_names(field, value))
+            if field in filters:
+                wanted &= filters[field]
+            filters[field] = frozenset(wanted)
+        return ResultSet(self._store, filters, self._renames)
+
+    def rename(self, field, mapping):
+        """Return a view in which values of field are renamed according to
+        mapping, e.g. results.rename('vm', {'PyPy': 'PyPy vs. CPython'}).
+        """
+
+        assert field in INDEXED_FIELDS and field != 'index', \
+            'Cannot rename %s.' % field
+        renames = dict(self._renames)
+        current = dict(renames.get(field, dict()))
+        for original in self._store.indexes[field]:
+            shown = current.get(original, original)
+            if shown in mapping:
+                current[original] = mapping[shown]
+        renames[field] = current
+        return ResultSet(self._store, self._filters, renames)
+
+    def display(self, field, value):
+        """Return the name this view uses for an original field value."""
+
+        return self._renames.get(field, dict()).get(value, value)
+
+    def key_of(self, record):
+        """Return the bench:vm:variant key this view uses for a record."""
+
+        return '%s:%s:%s' % (self.display('benchmark', record.benchmark),
+                             self.display('vm', record.vm),
+                             self.display('variant', record.variant))
+
+    def _original_names(self, field, value):
+        if field not in self._renames:
+            return [value]
+        renamed = self._renames[field]
+        return [original for original in self._store.indexes[field]
+                if renamed.get(original, original) == value]
+
+    def _accepts(self, machine, bench, vm, variant):
+        for field, value in (('machine', machine), ('benchmark', bench),
+                             ('vm', vm), ('variant', variant)):
+            if field in self._filters and value not in self._filters[field]:
+                return False
+        return True
+
+    def _triplets(self, machine=None):
+        for triplet in self._store.keys:
+            if machine is not None and self.display('machine', triplet[0]) != machine:
+                continue
+            if self._accepts(*triplet):
+                yield triplet
+
+    def records(self):
+        """Iterate over all records in this view, in insertion order."""
+
+        candidates = None
+        for field in self._filters:
+            positions = list()
+            for value in self._filters[field]:
+                positions.extend(self._store.indexes[field].get(value, ()))
+            if candidates is None or len(positions) < len(candidates):
+                candidates = positions
+        if candidates is None:
+            candidates = xrange(len(self._store.records))
+        else:
+            candidates = sorted(candidates)
+        for position in candidates:
+            record = self._store.records[position]
+            if all(getattr(record, field) in values
+                   for field, values in self._filters.iteritems()):
+                yield record
+
+    def __iter__(self):
+        return self.records()
+
+    def __len__(self):
+        return sum(1 for _ in self.records())
+
+    def _values(self, field):
+        return sorted(set(self.display(field, getattr(record, field))
+                          for record in self.records()))
+
+    def machines(self):
+        return sorted(set(self.display('machine', triplet[0])
+                          for triplet in self._triplets()))
+
+    def vms(self):
+        return self._values('vm')
+
+    def benchmarks(self):
+        return self._values('benchmark')
+
+    def variants(self):
+        return self._values('variant')
+
+    def keys(self, machine=None):
+        """Return sorted bench:vm:variant keys, including benchmarks with no
+        process executions.
+        """
+
+        return sorted(set('%s:%s:%s' % (self.display('benchmark', bench),
+                                        self.display('vm', vm),
+                                        self.display('variant', variant))
+                          for (_, bench, vm, variant) in self._triplets(machine)))
+
+    def pexecs(self, key, machine):
+        """Return a list of PExec records for one key on one machine, ordered
+        by pexec number. key should use the names of this view.
+        """
+
+        bench, vm, variant = key.split(':')
+        pexecs = list()
+        for triplet in itertools.product(self._original_names('machine', machine),
+                                         self._original_names('benchmark', bench),
+                                         self._original_names('vm', vm),
+                                         self._original_names('variant', variant)):
+            if triplet not in self._store.keys or not self._accepts(*triplet):
+                continue
+            for position in self._store.keys[triplet]:
+                record = self._store.records[position]
+                if 'index' in self._filters and record.index not in self._filters['index']:
+                    continue
+                pexecs.append(record)
+        return pexecs
@@ -35,14 +35,19 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import math
 import numpy
 import os
 import subprocess
 import traceback
 
+from warmup.bootstrapper import BOOTSTRAP_ITERATIONS_HIGHQ, BOOTSTRAP_ITERATIONS_LOWQ
+from warmup.bootstrapper import CONFIDENCE_LEVEL
 
 LOW_IQR_BOUND = 5.0
 HIGH_IQR_BOUND = 95.0
+# Largest number of resampled iterations to hold in memory at once.
+BOOTSTRAP_CHUNK_SIZE = 2 ** 22
 
 BOOTSTRAPPER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'warmup', 'bootstrapper.py')
 
@@ -70,3 +75,87 @@ def bootstrap_runner(marshalled_data, quality='HIGH'):
         print 'Bootstrapper script failed:'
         traceback.print_exc()
         return None, None
+
+
+def _bootstrap_iterations(quality):
+    if quality.lower() == 'high':
+        return BOOTSTRAP_ITERATIONS_HIGHQ
+    elif quality.lower() == 'low':
+        return BOOTSTRAP_ITERATIONS_LOWQ
+    raise ValueError("Unknown quality level '%s'" % quality)
+
+
+def _bootstrap_means(steady_segments_all_pexecs, iterations):
+    """Return at least `iterations` bootstrapped means of the steady state
+    segments of a number of process executions. Resampling is as per
+    bootstrapper.py (each segment is resampled separately, and each pexec
+    contributes the same number of resamples), but vectorised with numpy.
+    The means are interleaved, so that the ith mean is drawn from pexec
+    i % n_pexecs, and any prefix of the means draws equally from every pexec.
+    """
+
+    n_pexecs = len(steady_segments_all_pexecs)
+    n_resamples = iterations // n_pexecs + 1
+    means = numpy.empty((n_resamples, n_pexecs))
+    for pexec_index, segments in enumerate(steady_segments_all_pexecs):
+        data = numpy.concatenate([numpy.asarray(segment, dtype=numpy.float64) for segment in segments])
+        seg_lengths = [len(segment) for segment in segments]
+        # For each position in a resample: the length and offset of the
+        # segment which that position is drawn from.
+        lengths = numpy.repeat(seg_lengths, seg_lengths)
+        offsets = numpy.repeat(numpy.cumsum([0] + seg_lengths[:-1]), seg_lengths)
+        rows = max(1, BOOTSTRAP_CHUNK_SIZE // len(data))
+        for first in xrange(0, n_resamples, rows):
+            count = min(rows, n_resamples - first)
+            indices = offsets + (numpy.random.random_sample((count, len(data))) * lengths).astype(numpy.intp)
+            means[first:first + count, pexec_index] = data[indices].mean(axis=1)
+    return means.ravel()
+
+
+def _percentile_interval(sorted_data, confidence_level):
+    exclude = (1.0 - float(confidence_level)) / 2.0
+    length = len(sorted_data)
+    lower_index = int(math.floor(exclude * length))
+    upper_index = int(math.ceil((1.0 - exclude) * length))
+    return float(sorted_data[lower_index]), float(sorted_data[upper_index - 1])
+
+
+def bootstrap_steady_perf(steady_segments_all_pexecs, quality='HIGH',
+                          confidence_level=CONFIDENCE_LEVEL):
+    """Bootstrap the steady state performance of a list of pexecs, containing
+    a list of steady state segments, containing iteration times. This is the
+    numpy equivalent of bootstrapper.py (see bootstrap_runner()), and
+    returns the same (mean, CI) pair, followed by the bootstrapped means
+    themselves, which can be passed to bootstrap_steady_perf_diff().
+    """
+
+    means = _bootstrap_means(steady_segments_all_pexecs, _bootstrap_iterations(quality))
+    sorted_means = numpy.sort(means)
+    median = float(numpy.median(sorted_means))
+    lower, upper = _percentile_interval(sorted_means, confidence_level)
+    return median, ((upper - median) + (median - lower)) / 2.0, means
+
+
+def bootstrap_steady_perf_diff(before_means, after_means, confidence_level=CONFIDENCE_LEVEL):
+    """Compute the difference between the steady state performance of two
+    sets of process executions, from the bootstrapped means of each (as
+    returned by bootstrap_steady_perf()). No further resampling is needed:
+    the same means give each side's steady state performance and CI.
+
+    The two sides are resampled independently, so their means are paired
+    in order. As the means of each side are interleaved by pexec, every
+    pexec on each side contributes equally to the pairs. The speedup
+    (before / after) and the difference (after - before) are then both
+    computed from the same pairs of means. This is a tighter test than
+    checking whether two separate confidence intervals overlap. Returns a
+    dictionary containing the median and confidence interval of each.
+    """
+
+    length = min(len(before_means), len(after_means))
+    before_means, after_means = before_means[:length], after_means[:length]
+    speedups = numpy.sort(before_means / after_means)
+    differences = numpy.sort(after_means - before_means)
+    return {'speedup': float(numpy.median(speedups)),
+            'speedup_ci': _percentile_interval(speedups, confidence_level),
+            'difference': float(numpy.median(differences)),
+            'difference_ci': _percentile_interval(differences, confidence_level)}
@@ -35,16 +35,26 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import hashlib
 import json
 import math
+import numpy
+import os
 
 from collections import Counter, OrderedDict
-from warmup.html import DIFF_LEGEND, get_symbol, html_histogram, HTML_TABLE_TEMPLATE
-from warmup.html import HTML_DIFF_TABLE_TEMPLATE, HTML_PAGE_TEMPLATE, HTML_SYMBOLS
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from warmup.html import DIFF_LEGEND, get_symbol, html_histogram_data, HTML_DIFF_TABLE_HEADER
+from warmup.html import HTML_HISTOGRAMS, HTML_PAGE_FOOTER, HTML_PAGE_HEADER, HTML_PAGE_TEMPLATE
+from warmup.html import HTML_SYMBOLS, HTML_TABLE_FOOTER, HTML_TABLE_HEADER, HTML_VIRTUAL_TABLE_TEMPLATE
+from warmup.html import HTML_VM_MATRIX_TEMPLATE, VM_MATRIX_LEGEND
+from warmup.krun_results import pretty_print_machine
 from warmup.latex import end_document, end_longtable, end_table, escape, format_median_ci
 from warmup.latex import format_median_error, get_latex_symbol_map, preamble
 from warmup.latex import start_longtable, start_table, STYLE_SYMBOLS
+from warmup.results import ResultSet
 from warmup.statistics import bootstrap_runner, median_iqr
+from warmup.vm_instruments import instr_data_file, INSTRUMENTATION_PARSERS
 
 JSON_VERSION_NUMBER = '2'
 
@@ -71,114 +81,488 @@ WORSE = 3
 SKIPPED_BEFORE = 0
 SKIPPED_AFTER = 1
 
+CI_MINIUM_SIGNIFICANT_NARROWING = 0.0001 # In seconds
 
-def collect_summary_statistics(data_dictionaries, delta, steady_state, quality='HIGH'):
+ALPHA = 0.01  # Significance level for classification confidence intervals.
+CATEGORIES = ['warmup', 'slowdown', 'flat', 'no steady state']
+
+
+def _fingerprint(p_execs, delta, steady_state, quality):
+    """Return a hash of all data and settings which the summary of one
+    benchmark depends on.
+    """
+
+    digest = hashlib.sha1()
+    digest.update(json.dumps([JSON_VERSION_NUMBER, delta, steady_state, quality.upper()]))
+    for p_exec in p_execs:
+        digest.update(str(len(p_exec.wallclock_times)))
+        digest.update(numpy.asarray(p_exec.wallclock_times, dtype='<f8').tobytes())
+        digest.update(json.dumps([p_exec.all_outliers, p_exec.changepoints,
+                                  p_exec.changepoint_means, p_exec.changepoint_vars,
+                                  p_exec.classification]))
+    return digest.hexdigest()
+
+
+def do_intervals_differ((x1, y1), (x2, y2)):
+    """Given two IQRs or CIs return True if they do NOT overlap."""
+
+    assert y1 >= x1 and y2 >= x2
+    return y1 < x2 or y2 < x1
+
+
+def does_interval_narrow((x1, y1), (x2, y2)):
+    """Return True if the second interval is narrower than the first."""
+
+    assert y1 >= x1 and y2 >= x2
+    # Sometimes there is no variation in a dataset (more likely for steady iter
+    # than steady perf, for obvious reasons). So, we check for special cases,
+    # rather than causing a divide by zero.
+    diff1, diff2 = y1 - x1, y2 - x2
+    if diff1 == 0 and diff2 == 0:
+        return SAME
+    if diff1 == 0 and diff2 > 0:
+        return WORSE
+    ratio = float(diff2) / float(diff1)
+    if ratio == 1.0:
+        return SAME
+    elif ratio < 1.0:
+        return BETTER
+    return WORSE
+
+
+def do_mean_cis_differ(mean1, ci1, mean2, ci2):
+    """Given two means +/- CIs return True if they do NOT overlap."""
+
+    assert ci1 >= 0.0 and ci2 >= 0.0, 'Found negative confidence interval from bootstrapping.'
+    x1 = mean1 - ci1
+    y1 = mean1 + ci1
+    x2 = mean2 - ci2
+    y2 = mean2 + ci2
+    return do_intervals_differ((x1, y1), (x2, y2))
+
+
+def does_ci_narrow(mean1, ci1, mean2, ci2):
+    """Return True if the second interval is narrower than the first."""
+
+    assert ci1 >= 0.0 and ci2 >= 0.0, 'Found negative confidence interval from bootstrapping.'
+    if abs(ci1 - ci2) < CI_MINIUM_SIGNIFICANT_NARROWING:
+        return SAME
+    x1 = mean1 - ci1
+    y1 = mean1 + ci1
+    x2 = mean2 - ci2
+    y2 = mean2 + ci2
+    return does_interval_narrow((x1, y1), (x2, y2))
+
+
+def all_flat(classifications):
+    """Return True if all pexecs in a detailed classification dict are 'flat'."""
+
+    return (classifications['warmup'] == 0 and classifications['slowdown'] == 0
+            and classifications['no steady state'] == 0)
+
+
+def all_nss(classifications):
+    """Return True if all pexecs in a detailed classification dict are 'no steady state'."""
+
+    return (classifications['warmup'] == 0 and classifications['slowdown'] == 0 and
+            classifications['flat'] == 0)
+
+
+def any_nss(classifications):
+    """Return True if any pexec in a detailed classification dict is 'no steady state'."""
+
+    return classifications['no steady state'] > 0
+
+
+def _steady_perf_differs(base_case, sample, perf_diff=None):
+    """Return True if the steady state performance of two summaries of one
+    benchmark differs. See diff_benchmark().
+    """
+
+    if perf_diff is not None:
+        lower, upper = perf_diff['difference_ci']
+        return upper < 0.0 or lower > 0.0
+    return do_mean_cis_differ(base_case['steady_state_time'], base_case['steady_state_time_ci'],
+                              sample['steady_state_time'], sample['steady_state_time_ci'])
+
+
+def diff_benchmark(base_case, sample, before_class_ci, after_class_ci, perf_diff=None):
+    """Compare two summaries of one benchmark, generated by
+    collect_summary_statistics() before (base_case) and after (sample) a
+    change. before_class_ci and after_class_ci hold confidence intervals for
+    the proportion of process executions in each of CATEGORIES. If perf_diff
+    is the output of bootstrap_steady_perf_diff() for this benchmark, it is
+    used to decide whether steady state performance differs.
+
+    Returns a list indexed by CLASSIFICATIONS, STEADY_ITER, STEADY_ITER_VAR,
+    STEADY_STATE_TIME, STEADY_STATE_TIME_VAR and INTERSECTION.
+    """
+
+    diff = [None, None, None, None, None, None]
+    for category in CATEGORIES:
+        cat_index = CATEGORIES.index(category)
+        if do_intervals_differ(before_class_ci[cat_index], after_class_ci[cat_index]):
+            if (sample['detailed_classification']['warmup'] + sample['detailed_classification']['flat'] >
+                    base_case['detailed_classification']['warmup'] + base_case['detailed_classification']['flat']):
+                diff[CLASSIFICATIONS] = BETTER
+                break
+            elif (sample['detailed_classification']['no steady state'] + sample['detailed_classification']['slowdown'] >
+                    base_case['detailed_classification']['no steady state'] + base_case['detailed_classification']['slowdown']):
+                diff[CLASSIFICATIONS] = WORSE
+                break
+            else:
+                diff[CLASSIFICATIONS] = DIFFERENT
+                break
+    else:
+        diff[CLASSIFICATIONS] = SAME
+    # If the CIs did not overlap, but the ONLY difference is in the number
+    # of warmups / flats, we say the results were the same (because we see
+    # warmups / flats are the same case).
+    if diff[CLASSIFICATIONS] != SAME and \
+            base_case['detailed_classification']['slowdown'] == sample['detailed_classification']['slowdown'] and \
+            base_case['detailed_classification']['no steady state'] == sample['detailed_classification']['no steady state']:
+        diff[CLASSIFICATIONS] = SAME
+    # If the CIs do overlap, but the classification has moved from bad
+    # inconsistent to good inconsistent, then we say the result was better.
+    if diff[CLASSIFICATIONS] == SAME and \
+            base_case['detailed_classification']['no steady state'] > 0 and \
+            sample['detailed_classification']['no steady state'] == 0:
+        diff[CLASSIFICATIONS] = BETTER
+    # That completes the category data. The remaining logic deals with the
+    # numerical data (time to reach a steady state, steady state time per
+    # iteration), and produces an overall classification for this benchmark.
+    # Case 1) All flat.
+    if (all_flat(sample['detailed_classification']) and all_flat(base_case['detailed_classification'])):
+        diff[STEADY_ITER] = SAME
+        if base_case['steady_state_time_ci'] is None:
+            diff[STEADY_STATE_TIME] = DIFFERENT
+        elif _steady_perf_differs(base_case, sample, perf_diff):
+            if sample['steady_state_time'] < base_case['steady_state_time']:
+                diff[STEADY_STATE_TIME] = BETTER
+            else:
+                diff[STEADY_STATE_TIME] = WORSE
+        else:
+            diff[STEADY_STATE_TIME] = SAME
+            var = does_ci_narrow(base_case['steady_state_time'], base_case['steady_state_time_ci'],
+                                 sample['steady_state_time'], sample['steady_state_time_ci'])
+            diff[STEADY_STATE_TIME_VAR] = var
+    # Case 2) One ALL FLAT, one not.
+    elif (all_flat(sample['detailed_classification']) or all_flat(base_case['detailed_classification'])):
+        if (any_nss(sample['detailed_classification']) or any_nss(base_case['detailed_classification'])):
+            diff[STEADY_ITER] = DIFFERENT
+        elif (all_flat(base_case['detailed_classification']) and
+              do_intervals_differ((1.0, 1.0), sample['steady_state_iteration_iqr'])):
+            if sample['steady_state_iteration'] < base_case['steady_state_iteration']:
+                diff[STEADY_ITER] = BETTER
+            else:
+                diff[STEADY_ITER] = WORSE
+        elif (all_flat(sample['detailed_classification']) and
+              do_intervals_differ((1.0, 1.0), base_case['steady_state_iteration_iqr'])):
+            if sample['steady_state_iteration'] < base_case['steady_state_iteration']:
+                diff[STEADY_ITER] = BETTER
+            else:
+                diff[STEADY_ITER] = WORSE
+        else:
+            diff[STEADY_ITER] = SAME
+        if (any_nss(sample['detailed_classification']) or any_nss(base_case['detailed_classification'])):
+            diff[STEADY_STATE_TIME] = DIFFERENT
+        elif _steady_perf_differs(base_case, sample, perf_diff):
+            if sample['steady_state_time'] < base_case['steady_state_time']:
+                diff[STEADY_STATE_TIME] = BETTER
+            else:
+                diff[STEADY_STATE_TIME] = WORSE
+        else:
+            diff[STEADY_STATE_TIME] = SAME
+            var = does_ci_narrow(base_case['steady_state_time'], base_case['steady_state_time_ci'],
+                                 sample['steady_state_time'], sample['steady_state_time_ci'])
+            diff[STEADY_STATE_TIME_VAR] = var
+    # Case 3) One contains an NSS (therefore no steady iter / perf available).
+    elif (any_nss(sample['detailed_classification']) or any_nss(base_case['detailed_classification'])):
+        pass
+    # Case 4) All three measures should be available in both the DEFAULT_ITER and last_iter cases.
+    else:
+        # If n_pexecs is small, and the steady_iters are all identical,
+        # we sometimes get odd IQRs like [7.000000000000001, 7.0], so
+        # deal with this as a special case to avoid triggering the assertion
+        # in do_intervals_differ.
+        if len(set(sample['steady_state_iteration_list'])) == 1:
+            fake_iqr = (float(sample['steady_state_iteration_list'][0]), float(sample['steady_state_iteration_list'][0]))
+            if do_intervals_differ(base_case['steady_state_iteration_iqr'], fake_iqr):
+                if sample['steady_state_iteration'] < base_case['steady_state_iteration']:
+                    diff[STEADY_ITER] = BETTER
+                else:
+                    diff[STEADY_ITER] = WORSE
+            else:
+                diff[STEADY_ITER] = SAME
+            diff[STEADY_ITER_VAR] = SAME
+        elif do_intervals_differ(base_case['steady_state_iteration_iqr'],
+                                 sample['steady_state_iteration_iqr']):
+            if sample['steady_state_iteration'] < base_case['steady_state_iteration']:
+                diff[STEADY_ITER] = BETTER
+            else:
+                diff[STEADY_ITER] = WORSE
+            var = does_interval_narrow(base_case['steady_state_iteration_iqr'], sample['steady_state_iteration_iqr'])
+            diff[STEADY_ITER_VAR] = var
+        else:
+            diff[STEADY_ITER] = SAME
+            var = does_interval_narrow(base_case['steady_state_iteration_iqr'], sample['steady_state_iteration_iqr'])
+            diff[STEADY_ITER_VAR] = var
+        if _steady_perf_differs(base_case, sample, perf_diff):
+            if sample['steady_state_time'] < base_case['steady_state_time']:
+                diff[STEADY_STATE_TIME] = BETTER
+            else:
+                diff[STEADY_STATE_TIME] = WORSE
+        else:
+            diff[STEADY_STATE_TIME] = SAME
+        var = does_ci_narrow(base_case['steady_state_time'], base_case['steady_state_time_ci'],
+                             sample['steady_state_time'], sample['steady_state_time_ci'])
+        diff[STEADY_STATE_TIME_VAR] = var
+    # Was the benchmark better or worse overall?
+    if not (BETTER in diff or WORSE in diff or
+            DIFFERENT in diff):
+        diff[INTERSECTION] = SAME
+    elif BETTER in diff and not WORSE in diff:
+        diff[INTERSECTION] = BETTER
+    elif WORSE in diff and not BETTER in diff:
+        diff[INTERSECTION] = WORSE
+    else:
+        diff[INTERSECTION] = DIFFERENT
+    return diff
+
+
+def steady_state_segments(p_exec, delta):
+    """Return the steady state segments of a process execution which reached a
+    steady state, and the index of the first steady state segment.
+
+    The final segment is always a steady state segment, as is any run of
+    segments immediately before it whose means are equivalent to the final
+    segment (within delta, or the variance of either segment). Segments are
+    returned last first, as numpy arrays of wallclock times with outliers
+    removed.
+    """
+
+    times = p_exec.wallclock_times
+    keep = numpy.ones(len(times), dtype=bool)
+    keep[p_exec.all_outliers] = False
+    # The final segment includes the last changepoint itself.
+    start = p_exec.changepoints[-1] if p_exec.changepoints else 0
+    segments = [times[start:][keep[start:]]]
+    first_steady_segment = len(p_exec.changepoint_means) - 1
+    last_segment_mean = p_exec.changepoint_means[-1]
+    last_segment_var = p_exec.changepoint_vars[-1]
+    lower_bound = min(last_segment_mean - last_segment_var, last_segment_mean - delta)
+    upper_bound = max(last_segment_mean + last_segment_var, last_segment_mean + delta)
+    for index in xrange(len(p_exec.changepoint_means) - 2, -1, -1):
+        current_segment_mean = p_exec.changepoint_means[index]
+        current_segment_var = p_exec.changepoint_vars[index]
+        if not (current_segment_mean + current_segment_var >= lower_bound and
+                current_segment_mean - current_segment_var <= upper_bound):
+            break
+        start = 0 if index == 0 else p_exec.changepoints[index - 1] + 1
+        end = p_exec.changepoints[index] + 1
+        segments.append(times[start:end][keep[start:end]])
+        first_steady_segment -= 1
+    return segments, first_steady_segment
+
+
+def instr_correlation(p_execs, instr_dir, delta):
+    """Correlate the GC and JIT events in the VM instrumentation data of all
+    process executions of one benchmark with their wallclock times, outliers
+    and changepoints. An iteration coincides with a GC (or JIT) event if any
+    time (or, for HotSpot collectors, any collection) was recorded for it.
+
+    Returns a dictionary recording the fraction of outliers, of warmup time
+    (all iterations before a steady state was reached, weighted by wallclock
+    time) and, for comparison, of all iterations which coincide with GC
+    events, JIT events or either. Returns None if no instrumentation data is
+    available.
+    """
+
+    if len(p_execs) == 0 or p_execs[0].vm not in INSTRUMENTATION_PARSERS:
+        return None
+    vm = p_execs[0].vm
+    shape = (len(p_execs), max(len(p_exec.wallclock_times) for p_exec in p_execs))
+    times = numpy.zeros(shape)
+    gc_events = numpy.zeros(shape, dtype=bool)
+    jit_events = numpy.zeros(shape, dtype=bool)
+    has_instr = numpy.zeros(shape, dtype=bool)  # Iterations with instrumentation data.
+    outliers = numpy.zeros(shape, dtype=bool)
+    warmup = numpy.zeros(shape, dtype=bool)
+    for row, p_exec in enumerate(p_execs):
+        if p_exec.crashed:
+            continue
+        filename = instr_data_file(p_exec.key, instr_dir, p_exec.index)
+        try:
+            parser = INSTRUMENTATION_PARSERS[vm].load(filename)
+        except IOError:
+            print('WARNING: Missing instrumentation data for: %s:%s:%s' %
+                  (p_exec.machine, p_exec.key, p_exec.index))
+            continue
+        charts = dict((chart.title.split()[0], chart.data) for chart in parser.chart_data)
+        iterations = min(len(p_exec.wallclock_times), len(charts['GC']), len(charts['JIT']))
+        times[row, :len(p_exec.wallclock_times)] = p_exec.wallclock_times
+        gc_events[row, :iterations] = numpy.asarray(charts['GC'][:iterations]) > 0
+        jit_events[row, :iterations] = numpy.asarray(charts['JIT'][:iterations]) > 0
+        has_instr[row, :iterations] = True
+        outliers[row, p_exec.all_outliers] = True
+        # As in _summarise_machine(), warmup ends at the first steady
+        # iteration. Flat executions have no warmup, and executions with no
+        # steady state never finish warming up, so neither is counted.
+        if p_exec.classification in ('warmup', 'slowdown'):
+            _, first_steady_segment = steady_state_segments(p_exec, delta)
+            warmup[row, :p_exec.changepoints[first_steady_segment - 1]] = True
+    if not has_instr.any():
+        return None
+    events = numpy.array([gc_events, jit_events, gc_events | jit_events])
+    correlation = {'process_executions': int(has_instr.any(axis=1).sum())}
+    for name, total_name, mask, weights in \
+            (('outliers', 'count', outliers, numpy.ones(shape)),
+             ('warmup', 'secs', warmup, times),
+             ('iterations', 'count', numpy.ones(shape, dtype=bool), numpy.ones(shape))):
+        weights = numpy.where(mask & has_instr, weights, 0.0)
+        total = weights.sum()
+        if total > 0:
+            fractions = ((events * weights).sum(axis=(1, 2)) / total).tolist()
+        else:
+            fractions = [None, None, None]
+        correlation[name] = {total_name: int(total) if total_name == 'count' else float(total),
+                             'gc': fractions[0], 'jit': fractions[1], 'gc_or_jit': fractions[2]}
+    return correlation
+
+
+def collect_summary_statistics(results, delta, steady_state, quality='HIGH', previous=None,
+                               instr_dir=None, bootstrap=None):
     """Create summary statistics of a dataset with classifications.
+    results may be a ResultSet, or a dictionary of machine -> Krun data as
+    returned by parse_krun_file_with_changepoints(), and may contain data from
+    any number of machines. Machines are summarised concurrently (most of the
+    work is done by bootstrapper subprocesses).
     Note that this function returns a dict which is consumed by other code to
     create tables. It also DEFINES the JSON format which the ../bin/warmup_stats
     script dumps to file.
+
+    If previous is a summary generated by an earlier call to this function,
+    any benchmark whose fingerprint (a hash of its data, changepoints and
+    the classifier settings) is unchanged is copied from previous, rather than
+    being recomputed. Instrumentation correlations are always recomputed.
+
+    The classifier settings are stored alongside the summary, so that
+    summaries can later be diffed without re-reading the original data.
+
+    If instr_dir is a directory of VM instrumentation data, each benchmark
+    with instrumentation data also records how its outliers and warmup
+    coincide with GC and JIT events (see instr_correlation()).
+
+    If bootstrap is given, it is called as bootstrap(machine, key, segments)
+    to bootstrap the steady state performance of each benchmark, and must
+    return a (mean, CI) pair. By default, bootstrapper.py is run with PyPy.
     """
 
-    summary_data = dict()
-    # Although the caller can pass >1 json file, there should never be two
-    # different machines.
-    assert len(data_dictionaries) == 1
-    machine = data_dictionaries.keys()[0]
-    summary_data = { 'machines': { machine: dict() }, 'warmup_format_version': JSON_VERSION_NUMBER }
-    # Parse data dictionaries.
-    keys = sorted(data_dictionaries[machine]['wallclock_times'].keys())
-    for key in sorted(keys):
-        wallclock_times = data_dictionaries[machine]['wallclock_times'][key]
-        if len(wallclock_times) == 0:
+    if not isinstance(results, ResultSet):
+        results = ResultSet.from_data_dictionaries(results)
+    machines = results.machines()
+    summarise = lambda machine: _summarise_machine(results, machine, delta, steady_state,
+                                                   quality, previous, bootstrap)
+    if len(machines) > 1:
+        pool = ThreadPool(min(len(machines), cpu_count()))
+        try:
+            machine_summaries = pool.map(summarise, machines)
+        finally:
+            pool.close()
+    else:
+        machine_summaries = [summarise(machine) for machine in machines]
+    if instr_dir:
+        for machine, machine_summary in zip(machines, machine_summaries):
+            for key in results.keys(machine):
+                bench, vm, _ = key.split(':')
+                if vm not in machine_summary or bench not in machine_summary[vm]:
+                    continue  # Skipped benchmark.
+                correlation = instr_correlation(results.pexecs(key, machine), instr_dir, delta)
+                if correlation is not None:
+                    machine_summary[vm][bench]['instrumentation'] = correlation
+    return {'machines': dict(zip(machines, machine_summaries)),
+            'classifier': {'delta': delta, 'steady': steady_state},
+            'warmup_format_version': JSON_VERSION_NUMBER}
+
+
+def _summarise_machine(results, machine, delta, steady_state, quality, previous, bootstrap):
+    """Summarise all benchmarks from one machine, returning a dictionary of
+    VM -> benchmark -> summary. See collect_summary_statistics().
+    """
+
+    def bootstrap_steady_state(key, segments):
+        if bootstrap is not None:
+            return bootstrap(machine, key, segments)
+        # Shell out to PyPy for speed.
+        mean_time, error_time = bootstrap_runner(json.dumps(segments), quality)
+        if mean_time is None or error_time is None:
+            raise ValueError()
+        return mean_time, error_time
+
+    machine_summary = dict()
+    for key in results.keys(machine):
+        p_execs = results.pexecs(key, machine)
+        if len(p_execs) == 0:
             print('WARNING: Skipping: %s from %s (no executions)' %
                    (key, machine))
-        elif len(wallclock_times[0]) == 0:
+        elif p_execs[0].crashed:
             print('WARNING: Skipping: %s from %s (benchmark crashed)' %
                   (key, machine))
         else:
             bench, vm, variant = key.split(':')
-            if vm not in summary_data['machines'][machine].keys():
-                summary_data['machines'][machine][vm] = dict()
+            if vm not in machine_summary.keys():
+                machine_summary[vm] = dict()
+            fingerprint = _fingerprint(p_execs, delta, steady_state, quality)
+            try:
+                previous_benchmark = previous['machines'][machine][vm][bench]
+            except (KeyError, TypeError):
+                previous_benchmark = None
+            if previous_benchmark is not None and previous_benchmark.get('fingerprint') == fingerprint:
+                # Instrumentation correlations are not covered by the
+                # fingerprint, so are recomputed (or dropped) by the caller.
+                machine_summary[vm][bench] = dict((field, value) for field, value
+                                                  in previous_benchmark.iteritems()
+                                                  if field != 'instrumentation')
+                continue
             # Get information for all p_execs of this key.
             categories = list()
             steady_state_means = list()
             steady_iters = list()
             time_to_steadys = list()
-            n_pexecs = len(data_dictionaries[machine]['wallclock_times'][key])
+            n_pexecs = len(p_execs)
             segments_for_bootstrap_all_pexecs = list()  # Steady state segments for all pexecs.
             # Lists of changepoints, outliers and segment means for each process execution.
             changepoints, outliers, segments = list(), list(), list()
-            for p_exec in xrange(n_pexecs):
-                segments_for_bootstrap_this_pexec = list()  # Steady state segments for this pexec.
-                changepoints.append(data_dictionaries[machine]['changepoints'][key][p_exec])
-                segments.append(data_dictionaries[machine]['changepoint_means'][key][p_exec])
-                outliers.append(data_dictionaries[machine]['all_outliers'][key][p_exec])
-                categories.append(data_dictionaries[machine]['classifications'][key][p_exec])
+            for p_exec in p_execs:
+                changepoints.append(p_exec.changepoints)
+                segments.append(p_exec.changepoint_means)
+                outliers.append(p_exec.all_outliers)
+                categories.append(p_exec.classification)
                 # Next we calculate the iteration at which a steady state was
                 # reached, it's average segment mean and the time to reach a
                 # steady state. However, the last segment may be equivalent to
                 # its adjacent segments, so we first need to know which segments
                 # are steady-state segments.
-                if data_dictionaries[machine]['classifications'][key][p_exec] == 'no steady state':
+                if p_exec.classification == 'no steady state':
                     continue
-                # Capture the last steady state segment for bootstrapping.
-                segment_data = list()
-                if data_dictionaries[machine]['changepoints'][key][p_exec]:
-                    start = data_dictionaries[machine]['changepoints'][key][p_exec][-1]
-                else:
-                    start = 0  # No changepoints in this pexec.
-                end = len(data_dictionaries[machine]['wallclock_times'][key][p_exec])
-                for segment_index in xrange(start, end):
-                    if segment_index in data_dictionaries[machine]['all_outliers'][key][p_exec]:
-                        continue
-                    segment_data.append(data_dictionaries[machine]['wallclock_times'][key][p_exec][segment_index])
-                segments_for_bootstrap_this_pexec.append(segment_data)
-
-                first_steady_segment = len(data_dictionaries[machine]['changepoint_means'][key][p_exec]) - 1
-                num_steady_segments = 1
-                last_segment_mean = data_dictionaries[machine]['changepoint_means'][key][p_exec][-1]
-                last_segment_var = data_dictionaries[machine]['changepoint_vars'][key][p_exec][-1]
-                lower_bound = min(last_segment_mean - last_segment_var, last_segment_mean - delta)
-                upper_bound = max(last_segment_mean + last_segment_var, last_segment_mean + delta)
-                # This for loop deals with segments that are equivalent to the
-                # final, steady state segment.
-                for index in xrange(len(data_dictionaries[machine]['changepoint_means'][key][p_exec]) - 2, -1, -1):
-                    current_segment_mean = data_dictionaries[machine]['changepoint_means'][key][p_exec][index]
-                    current_segment_var = data_dictionaries[machine]['changepoint_vars'][key][p_exec][index]
-                    if (current_segment_mean + current_segment_var >= lower_bound and
-                            current_segment_mean - current_segment_var<= upper_bound):
-                        # Extract this segment from the wallclock data for bootstrapping.
-                        segment_data = list()
-                        if index == 0:
-                            start = 0
-                            end = data_dictionaries[machine]['changepoints'][key][p_exec][index] + 1
-                        else:
-                            start = data_dictionaries[machine]['changepoints'][key][p_exec][index - 1] + 1
-                            end = data_dictionaries[machine]['changepoints'][key][p_exec][index] + 1
-                        for segment_index in xrange(start, end):
-                            if segment_index in data_dictionaries[machine]['all_outliers'][key][p_exec]:
-                                continue
-                            segment_data.append(data_dictionaries[machine]['wallclock_times'][key][p_exec][segment_index])
-                        segments_for_bootstrap_this_pexec.append(segment_data)
-                        # Increment / decrement counters.
-                        first_steady_segment -= 1
-                        num_steady_segments += 1
-                    else:
-                        break
-                segments_for_bootstrap_all_pexecs.append(segments_for_bootstrap_this_pexec)
-                # End of code to capture segments for bootstrapping.
-                steady_state_mean = (math.fsum(data_dictionaries[machine]['changepoint_means'][key][p_exec][first_steady_segment:])
+                segments_for_bootstrap_this_pexec, first_steady_segment = \
+                    steady_state_segments(p_exec, delta)
+                segments_for_bootstrap_all_pexecs.append(
+                    [segment.tolist() for segment in segments_for_bootstrap_this_pexec])
+                num_steady_segments = len(segments_for_bootstrap_this_pexec)
+                steady_state_mean = (math.fsum(p_exec.changepoint_means[first_steady_segment:])
                                      / float(num_steady_segments))
                 steady_state_means.append(steady_state_mean)
                 # Not all process execs have changepoints. However, all
                 # p_execs will have one or more segment mean.
-                if data_dictionaries[machine]['classifications'][key][p_exec] != 'flat':
-                    steady_iter = data_dictionaries[machine]['changepoints'][key][p_exec][first_steady_segment - 1]
+                if p_exec.classification != 'flat':
+                    steady_iter = p_exec.changepoints[first_steady_segment - 1]
                     steady_iters.append(steady_iter + 1)
-                    to_steady = 0.0
-                    for index in xrange(steady_iter):
-                        to_steady += data_dictionaries[machine]['wallclock_times'][key][p_exec][index]
-                    time_to_steadys.append(to_steady)
+                    # Sum of all iterations before steady_iter, added in order.
+                    if steady_iter > 0:
+                        time_to_steadys.append(float(numpy.cumsum(p_exec.wallclock_times[:steady_iter])[-1]))
+                    else:
+                        time_to_steadys.append(0.0)
                 else:  # Flat execution, with no changepoints.
                     steady_iters.append(1)
                     time_to_steadys.append(0.0)
@@ -204,17 +588,9 @@ def collect_summary_statistics(data_dictionaries, delta, steady_state, quality='
             elif categories_set == set(['flat']):
                 median_iter, error_iter = None, None
                 median_time_to_steady, error_time_to_steady = None, None
-                # Shell out to PyPy for speed.
-                marshalled_data = json.dumps(segments_for_bootstrap_all_pexecs)
-                mean_time, error_time = bootstrap_runner(marshalled_data, quality)
-                if mean_time is None or error_time is None:
-                    raise ValueError()
+                mean_time, error_time = bootstrap_steady_state(key, segments_for_bootstrap_all_pexecs)
             else:
-                # Shell out to PyPy for speed.
-                marshalled_data = json.dumps(segments_for_bootstrap_all_pexecs)
-                mean_time, error_time = bootstrap_runner(marshalled_data, quality)
-                if mean_time is None or error_time is None:
-                    raise ValueError()
+                mean_time, error_time = bootstrap_steady_state(key, segments_for_bootstrap_all_pexecs)
                 if steady_iters:
                     median_iter, error_iter = median_iqr([float(val) for val in steady_iters])
                     median_time_to_steady, error_time_to_steady = median_iqr(time_to_steadys)
@@ -240,27 +616,125 @@ def collect_summary_statistics(data_dictionaries, delta, steady_state, quality='
                               'outliers':outliers[index], 'changepoints':changepoints[index],
                               'segment_means':segments[index]})
             current_benchmark['process_executons'] = pexecs
-            summary_data['machines'][machine][vm][bench] = current_benchmark
+            current_benchmark['fingerprint'] = fingerprint
+            machine_summary[vm][bench] = current_benchmark
+    return machine_summary
+
+
+def summary_cache_file(cache_dir, results_file, db=None):
+    """Return the name of the file in cache_dir which caches the summary of
+    results_file (or of the run results_file, if db is given).
+    """
+
+    if db is not None:
+        name = '%s_run%s' % (os.path.splitext(os.path.basename(db))[0], results_file)
+    else:
+        name = os.path.basename(results_file)
+        for suffix in ('.bz2', '.json'):
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+    return os.path.join(cache_dir, name + '_summary.json')
+
+
+def summarise_cached(results, classifier, cache_file=None, quality='HIGH', bootstrap=None):
+    """Summarise results with collect_summary_statistics(), reusing (and
+    updating) any summary in cache_file. classifier is a dictionary holding
+    the delta and steady values used by the classifier. bootstrap is passed
+    to collect_summary_statistics().
+    """
+
+    previous = None
+    if cache_file is not None and os.path.exists(cache_file):
+        with open(cache_file, 'r') as fd:
+            previous = json.load(fd)
+        if previous.get('warmup_format_version') != JSON_VERSION_NUMBER:
+            previous = None
+    summary_data = collect_summary_statistics(results, classifier['delta'], classifier['steady'],
+                                              quality=quality, previous=previous,
+                                              bootstrap=bootstrap)
+    if cache_file is not None:
+        with open(cache_file, 'w') as fd:
+            json.dump(summary_data, fd, sort_keys=True, ensure_ascii=True, indent=4)
     return summary_data
 
 
+def vm_comparison_matrix(summary_data):
+    """Compare the steady state performance of every pair of VMs, for every
+    benchmark in a summary generated by collect_summary_statistics(). No
+    further bootstrapping is needed, as each VM is summarised once.
+
+    Returns a dictionary of machine -> benchmark -> matrices, in which
+    speedup[i][j] is the steady state time of VM j divided by that of VM i,
+    and comparison[i][j] is BETTER if VM i is significantly faster than VM j
+    (i.e. their confidence intervals do not overlap), WORSE if it is
+    significantly slower, or SAME. Entries are None where either VM did not
+    reach a steady state, or did not run the benchmark.
+    """
+
+    matrices = dict()
+    for machine in sorted(summary_data['machines']):
+        vms = sorted(summary_data['machines'][machine])
+        benchmarks = sorted(set(bench for vm in vms for bench in summary_data['machines'][machine][vm]))
+        matrices[machine] = dict()
+        for bench in benchmarks:
+            means = numpy.empty(len(vms))
+            cis = numpy.empty(len(vms))
+            for index, vm in enumerate(vms):
+                bmark = summary_data['machines'][machine][vm].get(bench)
+                if bmark is None or bmark['steady_state_time'] is None:
+                    means[index], cis[index] = numpy.nan, numpy.nan
+                else:
+                    means[index], cis[index] = bmark['steady_state_time'], bmark['steady_state_time_ci']
+            lower, upper = means - cis, means + cis
+            with numpy.errstate(invalid='ignore'):  # NaNs mark missing data.
+                speedup = means[numpy.newaxis, :] / means[:, numpy.newaxis]
+                faster = upper[:, numpy.newaxis] < lower[numpy.newaxis, :]
+                slower = upper[numpy.newaxis, :] < lower[:, numpy.newaxis]
+            comparison = numpy.where(faster, BETTER, numpy.where(slower, WORSE, SAME))
+            missing = numpy.isnan(speedup)
+            matrices[machine][bench] = {
+                'vms': vms,
+                'steady_state_time': [None if numpy.isnan(mean) else mean for mean in means],
+                'steady_state_time_ci': [None if numpy.isnan(ci) else ci for ci in cis],
+                'speedup': [[None if missing[i, j] else float(speedup[i, j])
+                             for j in xrange(len(vms))] for i in xrange(len(vms))],
+                'comparison': [[None if missing[i, j] else int(comparison[i, j])
+                                for j in xrange(len(vms))] for i in xrange(len(vms))],
+            }
+    return {'machines': matrices, 'classifier': summary_data.get('classifier'),
+            'warmup_format_version': JSON_VERSION_NUMBER}
+
+
+def _machine_vms(summary_data):
+    """Return sorted (machine, VM) pairs for all VMs in a summary."""
+
+    return [(machine, vm) for machine in sorted(summary_data['machines'])
+            for vm in sorted(summary_data['machines'][machine])]
+
+
+def vm_label(machine, vm, machines, pretty_print=str):
+    """Return the heading under which results for one VM are reported. If a
+    summary contains data from more than one machine, the heading also names
+    the machine.
+    """
+
+    if len(machines) == 1:
+        return vm
+    return '%s, %s' % (vm, pretty_print(machine))
+
+
 def convert_to_latex(summary_data, delta, steady_state, diff=None, previous=None):
     assert 'warmup_format_version' in summary_data and summary_data['warmup_format_version'] == JSON_VERSION_NUMBER, \
         'Cannot process data from old JSON formats.'
     if (diff and not previous) or (previous and not diff):
         assert False, 'convert_to_latex needs both diff and previous arguments.'
-    machine = None
-    for key in summary_data['machines']:
-        if key == 'warmup_format_version':
-            continue
-        elif machine is not None:
-            assert False, 'Cannot summarise data from more than one machine.'
-        else:
-            machine = key
+    machines = sorted(summary_data['machines'])
+    assert not diff or len(machines) == 1, 'Cannot diff data from more than one machine.'
     benchmark_names = set()
     latex_summary = dict()
-    for vm in summary_data['machines'][machine]:
-        latex_summary[vm] = dict()
+    for machine, vm in _machine_vms(summary_data):
+        label = vm_label(machine, vm, machines, pretty_print_machine)
+        latex_summary[label] = dict()
         for bmark_name in summary_data['machines'][machine][vm]:
             # If a bmark appears in the summary data but was skipped in the
             # 'previous' data, then we do not want it to appear in the diff.
@@ -345,12 +819,12 @@ def convert_to_latex(summary_data, delta, steady_state, diff=None, previous=None
                                                      change=change)
             else:
                 time_to_steady = ''
-            latex_summary[vm][bmark_name] = {'style': reported_category,
+            latex_summary[label][bmark_name] = {'style': reported_category,
                 'last_cpt': mean_steady_iter, 'last_mean': mean_steady,
                 'time_to_steady_state': time_to_steady,
                 'steady_iter_var': steady_iter_var,
                 'steady_time_var': steady_time_var}
-    return machine, list(sorted(benchmark_names)), latex_summary
+    return ', '.join(machines), list(sorted(benchmark_names)), latex_summary
 
 
 def write_latex_table(machine, all_benchs, summary, tex_file, with_preamble=False,
@@ -477,22 +951,78 @@ def htmlify_histogram(nth):
     return '<div id="bar%d" class="histogram"></div>' % nth
 
 
-def write_html_table(summary_data, html_filename, diff=None, skipped=None, previous=None):
+def html_classification(bmark):
+    """Return HTML describing the classification of one benchmark summary."""
+
+    if bmark['classification'] == 'bad inconsistent':
+        reported_category = get_symbol('bad inconsistent')
+        cats_sorted = OrderedDict(sorted(bmark['detailed_classification'].items(),
+                                         key=lambda x: x[1], reverse=True))
+        cat_counts = list()
+        for category in cats_sorted:
+            if cats_sorted[category] == 0:
+                continue
+            cat_counts.append('%d %s' % (cats_sorted[category], get_symbol(category)))
+        reported_category += ' (%s)' % ', '.join(cat_counts)
+    elif bmark['classification'] == 'good inconsistent':
+        reported_category = get_symbol('good inconsistent')
+        cats_sorted = OrderedDict(sorted(bmark['detailed_classification'].items(),
+                                         key=lambda x: x[1], reverse=True))
+        cat_counts = list()
+        for category in cats_sorted:
+            if cats_sorted[category] == 0:
+                continue
+            cat_counts.append('%d %s' % (cats_sorted[category], get_symbol(category)))
+        reported_category += ' (%s)' % ', '.join(cat_counts)
+    elif (sum(bmark['detailed_classification'].values()) ==
+          bmark['detailed_classification'][bmark['classification']]):
+        # Consistent benchmark with no errors.
+        reported_category = get_symbol(bmark['classification'])
+    else:  # No inconsistencies, but some process executions errored.
+        reported_category = ' %s %d' % (get_symbol(bmark['classification']),
+                                      bmark['detailed_classification'][bmark['classification']])
+    return reported_category
+
+
+def write_html_table(summary_data, html_filename, diff=None, skipped=None, previous=None,
+                     speedups=None):
+    """Write out a summary as an HTML table. If diff is given, the table is
+    coloured to show changes against previous. speedups may map VMs and
+    benchmarks to the output of bootstrap_steady_perf_diff().
+
+    Rows are written out as they are generated. The data for every histogram
+    is written once, at the end of the page, and drawn by the browser.
+    """
+
     assert 'warmup_format_version' in summary_data and summary_data['warmup_format_version'] == JSON_VERSION_NUMBER, \
         'Cannot process data from old JSON formats.'
-    machine = None
-    for key in summary_data['machines']:
-        if key == 'warmup_format_version':
-            continue
-        elif machine is not None:
-            assert False, 'Cannot summarise data from more than one machine.'
-        else:
-            machine = key
-    html_table_contents = dict()  # VM name -> html rows
-    n_charts = 0
-    histograms = ''  # Javascript.
-    for vm in sorted(summary_data['machines'][machine]):
-        html_rows = ''  # Just the table rows, no table header, etc.
+    machines = sorted(summary_data['machines'])
+    assert not diff or len(machines) == 1, 'Cannot diff data from more than one machine.'
+    histograms = list()  # Filled in by _html_table_chunks().
+    with open(html_filename, 'w') as fp:
+        fp.write(HTML_PAGE_HEADER)
+        for chunk in _html_table_chunks(summary_data, histograms, diff, skipped, previous, speedups):
+            fp.write(chunk)
+        fp.write(HTML_HISTOGRAMS % json.dumps(histograms, separators=(',', ':')))
+        fp.write('\n\n')
+        fp.write(HTML_SYMBOLS + '\n\n')
+        fp.write(HTML_PAGE_FOOTER)
+
+
+def _html_table_chunks(summary_data, histograms, diff, skipped, previous, speedups):
+    """Generate the HTML tables for write_html_table(), in order, as strings.
+    The data for each histogram is appended to histograms: the nth histogram
+    is drawn into the element with id "bar<n>".
+    """
+
+    machines = sorted(summary_data['machines'])
+    if diff:
+        yield DIFF_LEGEND
+        table_header = HTML_DIFF_TABLE_HEADER
+    else:
+        table_header = HTML_TABLE_HEADER
+    for machine, vm in _machine_vms(summary_data):
+        yield table_header % vm_label(machine, vm, machines)
         if skipped is not None:
             skipped_before = [b for (b, v) in skipped[SKIPPED_BEFORE] if v == vm]
         else:
@@ -523,49 +1053,23 @@ def write_html_table(summary_data, html_filename, diff=None, skipped=None, previ
                         # Benchmark name, classification, steady iter, time to reach, steady perf
                         row = ('<tr>%s%s%s%s%s</tr>\n' %
                                (bmark_cell, category_cell, blank_cell, blank_cell, blank_cell))
-                    html_rows += row
+                    yield row
                 continue
-            if bmark['classification'] == 'bad inconsistent':
-                reported_category = get_symbol('bad inconsistent')
-                cats_sorted = OrderedDict(sorted(bmark['detailed_classification'].items(),
-                                                 key=lambda x: x[1], reverse=True))
-                cat_counts = list()
-                for category in cats_sorted:
-                    if cats_sorted[category] == 0:
-                        continue
-                    cat_counts.append('%d %s' % (cats_sorted[category], get_symbol(category)))
-                reported_category += ' (%s)' % ', '.join(cat_counts)
-            elif bmark['classification'] == 'good inconsistent':
-                reported_category = get_symbol('good inconsistent')
-                cats_sorted = OrderedDict(sorted(bmark['detailed_classification'].items(),
-                                                 key=lambda x: x[1], reverse=True))
-                cat_counts = list()
-                for category in cats_sorted:
-                    if cats_sorted[category] == 0:
-                        continue
-                    cat_counts.append('%d %s' % (cats_sorted[category], get_symbol(category)))
-                reported_category += ' (%s)' % ', '.join(cat_counts)
-            elif (sum(bmark['detailed_classification'].values()) ==
-                  bmark['detailed_classification'][bmark['classification']]):
-                # Consistent benchmark with no errors.
-                reported_category = get_symbol(bmark['classification'])
-            else:  # No inconsistencies, but some process executions errored.
-                reported_category = ' %s %d' % (get_symbol(bmark['classification']),
-                                     bmark['detailed_classification'][bmark['classification']])
+            reported_category = html_classification(bmark)
             if diff and vm in diff and bmark_name in diff[vm]:
                 category_cell = colour_html_cell(diff[vm][bmark_name][CLASSIFICATIONS], reported_category)
             else:
                 category_cell = '<td>%s</td>' % reported_category
             if bmark['steady_state_iteration'] is not None:
                 change = ''
-                histograms += html_histogram(bmark['steady_state_iteration_list'], n_charts)
+                histograms.append(html_histogram_data(bmark['steady_state_iteration_list']))
                 if diff and vm in diff and bmark_name in diff[vm] and diff[vm][bmark_name][STEADY_ITER] != SAME and \
                         previous['machines'][machine][vm][bmark_name]['steady_state_iteration']:
                     delta = bmark['steady_state_iteration'] - \
                         previous['machines'][machine][vm][bmark_name]['steady_state_iteration']
                     change = '<br/><small>&delta;=%.1f</small>' % delta
                 mean_steady_iter = '%s<div class="wrapper"><div class="tdcenter">%.1f%s<br/><small>(%.1f, %.1f)</small></div></div>' % \
-                    (htmlify_histogram(n_charts), bmark['steady_state_iteration'], change,
+                    (htmlify_histogram(len(histograms) - 1), bmark['steady_state_iteration'], change,
                      bmark['steady_state_iteration_iqr'][0], bmark['steady_state_iteration_iqr'][1])
                 if diff and vm in diff and bmark_name in diff[vm]:
                     mean_steady_iter_cell = colour_html_cell(diff[vm][bmark_name][STEADY_ITER], mean_steady_iter, 'center')
@@ -579,21 +1083,24 @@ def write_html_table(summary_data, html_filename, diff=None, skipped=None, previ
                         mean_steady_iter_var_cell = '<td></td>'
                 else:
                     mean_steady_iter_cell = '<td style="text-align: center;">%s</td>' % mean_steady_iter
-                n_charts += 1
             else:
                 mean_steady_iter_cell = '<td></td>'
                 if diff:
                     mean_steady_iter_var_cell = '<td></td>'
             if bmark['steady_state_time'] is not None:
                 change = ''
-                histograms += html_histogram(bmark['steady_state_time_list'], n_charts)
+                histograms.append(html_histogram_data(bmark['steady_state_time_list']))
                 if diff and vm in diff and bmark_name in diff[vm] and diff[vm][bmark_name][STEADY_STATE_TIME] != SAME and \
                         previous['machines'][machine][vm][bmark_name]['steady_state_time']:
                     delta = bmark['steady_state_time'] - \
                         previous['machines'][machine][vm][bmark_name]['steady_state_time']
                     change = '<br/><small>&delta;=%.5f</small>' % delta
+                if speedups and vm in speedups and bmark_name in speedups[vm]:
+                    speedup = speedups[vm][bmark_name]
+                    change += '<br/><small>speedup: %.3f (%.3f, %.3f)</small>' % \
+                        (speedup['speedup'], speedup['speedup_ci'][0], speedup['speedup_ci'][1])
                 mean_steady = '%s<div class="wrapper"><div class="tdright">%.5f%s<br/><small>&plusmn;%.6f</small></div></div>' % \
-                        (htmlify_histogram(n_charts), bmark['steady_state_time'], change, bmark['steady_state_time_ci'])
+                        (htmlify_histogram(len(histograms) - 1), bmark['steady_state_time'], change, bmark['steady_state_time_ci'])
                 if diff and vm in diff and bmark_name in diff[vm]:
                     mean_steady_cell = colour_html_cell(diff[vm][bmark_name][STEADY_STATE_TIME], mean_steady, 'right')
                     if diff[vm][bmark_name][STEADY_STATE_TIME_VAR] and diff[vm][bmark_name][STEADY_STATE_TIME_VAR] != 'SAME':
@@ -605,27 +1112,25 @@ def write_html_table(summary_data, html_filename, diff=None, skipped=None, previ
                         mean_steady_var_cell = '<td></td>'
                 else:
                     mean_steady_cell = '<td style="text-align: right;">%s</td>' % mean_steady
-                n_charts += 1
             else:
                 mean_steady_cell = '<td></td>'
                 if diff:
                     mean_steady_var_cell = '<td></td>'
             if bmark['steady_state_time_to_reach_secs'] is not None:
                 change = ''
-                histograms += html_histogram(bmark['steady_state_time_to_reach_secs_list'], n_charts)
+                histograms.append(html_histogram_data(bmark['steady_state_time_to_reach_secs_list']))
                 if diff and vm in diff and bmark_name in diff[vm] and diff[vm][bmark_name][STEADY_ITER] != SAME and \
                         previous['machines'][machine][vm][bmark_name]['steady_state_time_to_reach_secs']:
                     delta = bmark['steady_state_time_to_reach_secs'] - \
                         previous['machines'][machine][vm][bmark_name]['steady_state_time_to_reach_secs']
                     change = '<br/><small>&delta;=%.3f</small>' % delta
                 time_to_steady = '%s<div class="wrapper"><div class="tdcenter">%.3f%s<br/><small>(%.3f, %.3f)</small></div></div>' \
-                        % (htmlify_histogram(n_charts), bmark['steady_state_time_to_reach_secs'],
+                        % (htmlify_histogram(len(histograms) - 1), bmark['steady_state_time_to_reach_secs'],
                            change, bmark['steady_state_time_to_reach_secs_iqr'][0], bmark['steady_state_time_to_reach_secs_iqr'][1])
                 if diff and vm in diff and bmark_name in diff[vm]:
                     time_steady_cell = colour_html_cell(diff[vm][bmark_name][STEADY_ITER], time_to_steady, 'center')
                 else:
                     time_steady_cell = '<td style="text-align: center;">%s</td>' % time_to_steady
-                n_charts += 1
             else:
                 time_steady_cell = '<td></td>'
             if diff and vm in diff and bmark_name in diff[vm]:
@@ -642,18 +1147,75 @@ def write_html_table(summary_data, html_filename, diff=None, skipped=None, previ
                 # Benchmark name, classification, steady iter, time to reach, steady perf
                 row = ('<tr>%s%s%s%s%s</tr>\n' %
                        (bmark_cell, category_cell, mean_steady_iter_cell, time_steady_cell, mean_steady_cell))
-            html_rows += row
-        html_table_contents[vm] = html_rows
-    page_contents = ''
-    if diff:
-        page_contents += DIFF_LEGEND
-        table_template = HTML_DIFF_TABLE_TEMPLATE
-    else:
-        table_template = HTML_TABLE_TEMPLATE
-    for vm in html_table_contents:
-        page_contents += table_template % (vm, html_table_contents[vm])
-        page_contents += '\n\n'
-        page_contents += histograms + '\n\n'
-    page_contents += HTML_SYMBOLS + '\n\n'
+            yield row
+        yield HTML_TABLE_FOOTER + '\n\n'
+
+
+def write_html_virtual_table(summary_data, html_filename):
+    """Write out a summary as an HTML table which can be sorted and filtered,
+    and which only draws the rows in view. This is much quicker to load than
+    write_html_table() for very large numbers of benchmarks. Rather than HTML,
+    each row is a compact JSON array, see HTML_VIRTUAL_TABLE_TEMPLATE.
+    """
+
+    assert 'warmup_format_version' in summary_data and summary_data['warmup_format_version'] == JSON_VERSION_NUMBER, \
+        'Cannot process data from old JSON formats.'
+    machines = sorted(summary_data['machines'])
+    vms, rows = list(), list()
+    histograms = list()
+    for machine, vm in _machine_vms(summary_data):
+        vms.append(vm_label(machine, vm, machines))
+        for bmark_name in sorted(summary_data['machines'][machine][vm].keys()):
+            bmark = summary_data['machines'][machine][vm][bmark_name]
+            detail = sorted([(category, count) for category, count in
+                             bmark['detailed_classification'].items() if count > 0],
+                            key=lambda x: (-x[1], x[0]))
+            row = [len(vms) - 1, bmark_name, bmark['classification'], detail]
+            for key in ('steady_state_iteration', 'steady_state_time_to_reach_secs'):
+                if bmark[key] is None:
+                    row.extend([None, None, None, None])
+                else:
+                    histograms.append(html_histogram_data(bmark[key + '_list']))
+                    row.extend([bmark[key], bmark[key + '_iqr'][0], bmark[key + '_iqr'][1],
+                                len(histograms) - 1])
+            if bmark['steady_state_time'] is None:
+                row.extend([None, None, None])
+            else:
+                histograms.append(html_histogram_data(bmark['steady_state_time_list']))
+                row.extend([bmark['steady_state_time'], bmark['steady_state_time_ci'],
+                            len(histograms) - 1])
+            rows.append(row)
+    table_data = json.dumps({'vms': vms, 'rows': rows}, separators=(',', ':'))
+    with open(html_filename, 'w') as fp:
+        fp.write(HTML_PAGE_HEADER)
+        fp.write(HTML_HISTOGRAMS % json.dumps(histograms, separators=(',', ':')))
+        fp.write(HTML_SYMBOLS)
+        # Benchmark and VM names must not end the <script> element early.
+        fp.write(HTML_VIRTUAL_TABLE_TEMPLATE % table_data.replace('</', '<\\/'))
+        fp.write(HTML_PAGE_FOOTER)
+
+
+def write_html_vm_matrix(matrix_data, html_filename):
+    """Write out matrices generated by vm_comparison_matrix() as HTML."""
+
+    machines = sorted(matrix_data['machines'])
+    page_contents = VM_MATRIX_LEGEND
+    for machine in machines:
+        for bench in sorted(matrix_data['machines'][machine]):
+            matrix = matrix_data['machines'][machine][bench]
+            headings = '\n'.join('<th>%s</th>' % vm for vm in matrix['vms'])
+            html_rows = ''
+            for row, vm in enumerate(matrix['vms']):
+                cells = list()
+                for column in xrange(len(matrix['vms'])):
+                    if row == column or matrix['speedup'][row][column] is None:
+                        cells.append('<td></td>')
+                    else:
+                        cells.append(colour_html_cell(matrix['comparison'][row][column],
+                                                      '%.3f' % matrix['speedup'][row][column], 'right'))
+                html_rows += '<tr><td>%s</td>%s</tr>\n' % (vm, ''.join(cells))
+            title = bench if len(machines) == 1 else '%s, %s' % (bench, machine)
+            page_contents += HTML_VM_MATRIX_TEMPLATE % (title, headings, html_rows)
+            page_contents += '\n\n'
     with open(html_filename, 'w') as fp:
         fp.write(HTML_PAGE_TEMPLATE % page_contents)
@@ -38,6 +38,26 @@
 """Parsers to deal with the data from instrumented VMs.
 """
 import abc
+import hashlib
+import importlib
+import io
+import numpy
+import os
+import os.path
+import zipfile
+
+from warmup.krun_results import read_krun_results_file, stream_krun_results_file
+
+# Suffix of the files which cache the decoded chart data of an
+# instrumentation data file (see VMInstrumentParser.load()).
+INSTR_CACHE_SUFFIX = '.charts.npz'
+
+# Bumped whenever the layout of instrumentation cache files changes.
+INSTR_CACHE_VERSION = 1
+
+# Environment variable naming extra parsers, as a comma separated list of
+# VM=module:class entries, e.g. 'V8=v8_instruments:V8InstrumentParser'.
+INSTR_PARSERS_ENV = 'WARMUP_INSTR_PARSERS'
 
 
 def merge_instr_data(file_data):
@@ -49,6 +69,25 @@ def merge_instr_data(file_data):
     return instr_data
 
 
+def instr_data_file(key, instr_dir, pexec_idx):
+    """Return the name of the instrumentation data file for one process
+    execution."""
+
+    bench, vm, variant = key.split(":")
+    return os.path.join(instr_dir, "%s__%s__%s__%s.json.bz2" %
+                        (bench, vm, variant, pexec_idx))
+
+
+def _file_digest(filename):
+    """Return the SHA-1 hash of the contents of filename."""
+
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as fd:
+        for block in iter(lambda: fd.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 class ChartData(object):
     """Class to hold data needed by the plotting script.
     Each VM parser may parse a number of different events which need to be
@@ -72,6 +111,85 @@ class VMInstrumentParser(object):
         self.vm = vm
         self.chart_data = None
 
+    @classmethod
+    def from_file(cls, filename):
+        """Parse the instrumentation data in a (bzip2 compressed) JSON file.
+        Subclasses may override this to avoid reading a whole file into
+        memory at once.
+        """
+        return cls(read_krun_results_file(filename))
+
+    @classmethod
+    def load(cls, filename):
+        """Return a parser holding the chart data of the instrumentation data
+        in filename. Decoded chart data is cached in a sidecar file (filename
+        with INSTR_CACHE_SUFFIX appended), which is used in place of filename
+        for as long as the SHA-1 hash of filename is unchanged. Subclasses
+        are constructed with None when their data is read from the cache.
+        """
+
+        # Parsers are part of the key, so that changing parser invalidates
+        # any cached data.
+        cache_key = '%s:%s.%s:%s' % (INSTR_CACHE_VERSION, cls.__module__, cls.__name__,
+                                     _file_digest(filename))
+        cache_file = filename + INSTR_CACHE_SUFFIX
+        chart_data = cls._read_cache(cache_file, cache_key)
+        if chart_data is not None:
+            parser = cls(None)
+            parser.chart_data = chart_data
+            return parser
+        parser = cls.from_file(filename)
+        cls._write_cache(cache_file, cache_key, parser.chart_data)
+        return parser
+
+    @staticmethod
+    def _read_cache(cache_file, cache_key):
+        """Return the list of ChartData objects stored in cache_file, or None
+        if cache_file does not exist, or was not written with cache_key."""
+
+        try:
+            with open(cache_file, 'rb') as fd:
+                cache = numpy.load(fd, allow_pickle=False)
+                if cache['key'].item() != cache_key:
+                    return None
+                return [ChartData(title, cache['data_%d' % index].tolist(), legend_text)
+                        for index, (title, legend_text) in
+                        enumerate(zip(cache['titles'].tolist(), cache['legends'].tolist()))]
+        except (IOError, OSError, KeyError, ValueError, zipfile.BadZipfile):
+            return None
+
+    @staticmethod
+    def _write_cache(cache_file, cache_key, chart_data):
+        """Store chart_data (a list of ChartData objects) in cache_file."""
+
+        if not chart_data:
+            return
+        arrays = {'key': numpy.array(cache_key),
+                  'titles': numpy.array([chart.title for chart in chart_data]),
+                  'legends': numpy.array([chart.legend_text for chart in chart_data])}
+        for index, chart in enumerate(chart_data):
+            arrays['data_%d' % index] = numpy.asarray(chart.data, dtype=numpy.float64)
+        # Write to a temporary file first, so that an interrupted run never
+        # leaves a partial cache file. The cache is only an optimisation, so
+        # read-only instrumentation directories are not an error.
+        tmp_file = '%s.%d.tmp' % (cache_file, os.getpid())
+        try:
+            with open(tmp_file, 'wb') as fd:
+                # This is the layout numpy.savez_compressed() writes, but
+                # avoids it writing each array via a temporary file.
+                zip_file = zipfile.ZipFile(fd, 'w', zipfile.ZIP_DEFLATED)
+                for name, array in arrays.iteritems():
+                    npy = io.BytesIO()
+                    numpy.lib.format.write_array(npy, array, allow_pickle=False)
+                    zip_file.writestr(name + '.npy', npy.getvalue())
+                zip_file.close()
+            os.rename(tmp_file, cache_file)
+        except (IOError, OSError):
+            try:
+                os.unlink(tmp_file)
+            except OSError:
+                pass  # E.g. tmp_file could not be created.
+
     @abc.abstractmethod
     def parse_instr_data(self):
         """Parse VM instrumentation data.
@@ -103,77 +221,171 @@ class HotSpotInstrumentParser(VMInstrumentParser):
             return None
         raw_events = self.instr_data['raw_vm_events']
         iterations = len(raw_events)
-        jit_cumulative_times = [raw_events[i][1] for i in xrange(iterations)]
-        gc_cumulative_times = list()
+        jit_cumulative_times = numpy.array([event[1] for event in raw_events])
         # Sum GC times over all collectors that ran in each iteration.
-        for iteration in xrange(iterations):
-            gc_iteration = 0
-            for collector in raw_events[iteration][2]:
-                gc_iteration += collector[-1]
-            gc_cumulative_times.append(gc_iteration)
+        collector_info = [event[2] for event in raw_events]
+        gc_iteration_indices = numpy.repeat(numpy.arange(iterations),
+                                            [len(info) for info in collector_info])
+        gc_collector_times = numpy.array([collector[-1] for info in collector_info
+                                          for collector in info], dtype=numpy.float64)
+        gc_cumulative_times = numpy.bincount(gc_iteration_indices, weights=gc_collector_times,
+                                             minlength=iterations)
         # Turn the cumulative times in milliseconds into non-cumulative
         # times in seconds.
-        jit_times_secs = [jit_cumulative_times[0] / 1000.0]
-        gc_times_secs = [gc_cumulative_times[0] / 1000.0]
-        last_jit_time = jit_cumulative_times[0]
-        last_gc_time = gc_cumulative_times[0]
-        for iteration in xrange(1, iterations):
-            jit_times_secs.append((jit_cumulative_times[iteration] - last_jit_time) / 1000.0)
-            last_jit_time = jit_cumulative_times[iteration]
-            gc_times_secs.append((gc_cumulative_times[iteration] - last_gc_time) / 1000.0)
-            last_gc_time = gc_cumulative_times[iteration]
-        assert len(jit_times_secs) == len(jit_cumulative_times)
-        assert len(gc_times_secs) == len(gc_cumulative_times)
+        jit_times_secs = (numpy.diff(numpy.concatenate(([0], jit_cumulative_times))) / 1000.0).tolist()
+        gc_times_secs = (numpy.diff(numpy.concatenate(([0], gc_cumulative_times))) / 1000.0).tolist()
+        assert len(jit_times_secs) == iterations
+        assert len(gc_times_secs) == iterations
         self.chart_data = [
             ChartData('GC (secs)', gc_times_secs, 'GC events'),
             ChartData('JIT (secs)', jit_times_secs, 'JIT compilation')]
 
 
 class PyPyInstrumentParser(VMInstrumentParser):
-    """Parser for PyPy instrumentation data."""
+    """Parser for PyPy instrumentation data.
+    Data is in JSON format. For each in-process iteration, raw_vm_events holds
+    a tree of nested events of the form:
+      [eventType, startTime, stopTime, children]
+
+    Where the root of each tree has null start and stop times. Time spent in
+    each event, but not in its children, is counted as GC or JIT time for that
+    iteration. jit_times holds the JIT time of each iteration.
+    """
+
+    # Initial number of in-process iterations space is allocated for.
+    INITIAL_ITERATIONS = 1024
 
     def __init__(self, instr_data):
         VMInstrumentParser.__init__(self, 'PyPy')
         self.instr_data = instr_data if instr_data else None
         self.parse_instr_data()
 
+    @classmethod
+    def from_file(cls, filename):
+        """Parse instrumentation data one iteration at a time, so that memory
+        use does not depend on the size of the file."""
+
+        parser = cls(None)
+        parser._start(cls.INITIAL_ITERATIONS)
+        instr_data = stream_krun_results_file(filename, {'raw_vm_events': parser._parse_iteration})
+        parser._finish(instr_data.get('jit_times'))
+        return parser
+
     def parse_instr_data(self):
         if self.instr_data is None:
             return None
-        iterations = {'gc': [], 'jit': None}
+        self._start(len(self.instr_data['raw_vm_events']))
         for node in self.instr_data['raw_vm_events']:
-            event_type, start_time, stop_time, children = node
-            assert start_time == stop_time == None
-            iteration = {'gc': 0}
-            for child in children:
-                self._parse_node(child, iteration)
-            iterations['gc'].append(iteration['gc'])
-        iterations['jit'] = self.instr_data['jit_times']
+            self._parse_iteration(node)
+        self._finish(self.instr_data.get('jit_times'))
+
+    def _start(self, iterations):
+        # GC and JIT time (rows) for each in-process iteration (columns).
+        self._times = numpy.zeros((2, max(iterations, 1)))
+        self._iterations = 0
+
+    def _finish(self, jit_times):
+        gc_times = self._times[0, :self._iterations].tolist()
+        if jit_times is None:  # Fall back on the JIT events in the trees.
+            jit_times = self._times[1, :self._iterations].tolist()
         self.chart_data = (
-            [ChartData('GC', iterations['gc'], 'GC events') ,
-             ChartData('JIT', iterations['jit'], 'JIT tracing')])
+            [ChartData('GC', gc_times, 'GC events') ,
+             ChartData('JIT', jit_times, 'JIT tracing')])
 
-    def _parse_node(self, node, info):
-        """Recurse the event tree summing time spent in gc and tracing.
+    def _parse_iteration(self, node):
+        """Sum the net time spent in GC and JIT events in the event tree of
+        one in-process iteration.
         """
+
         event_type, start_time, stop_time, children = node
-        assert event_type != 'root'
-        child_time = 0
+        assert start_time == stop_time == None
+        if self._iterations == self._times.shape[1]:
+            self._times = numpy.concatenate((self._times, numpy.zeros(self._times.shape)), axis=1)
+        info = {'gc': 0, 'jit': 0}
         for child in children:
-            child_time += self._parse_node(child, info)
-        gross_time = stop_time - start_time
-        net_time = gross_time - child_time
-        if event_type.startswith('gc-'):
-            info['gc'] += net_time
-        elif event_type.startswith('jit-'):
-            info['jit'] += net_time
-        else:
-            print 'WARNING: unknown event in PyPy instrumentation: %s' % event_type
+            self._parse_node(child, info)
+        self._times[0, self._iterations] = info['gc']
+        self._times[1, self._iterations] = info['jit']
+        self._iterations += 1
+
+    def _parse_node(self, node, info):
+        """Walk the event tree under node, summing time spent in gc and
+        tracing. The tree is walked with an explicit stack, so that deeply
+        nested events cannot exceed Python's recursion limit.
+        """
+
+        # Each stack entry is [node, index of next child, net time of children].
+        stack = [[node, 0, 0]]
+        while stack:
+            entry = stack[-1]
+            children = entry[0][3]
+            if entry[1] < len(children):
+                stack.append([children[entry[1]], 0, 0])
+                entry[1] += 1
+                continue
+            stack.pop()
+            event_type, start_time, stop_time, _ = entry[0]
+            assert event_type != 'root'
+            gross_time = stop_time - start_time
+            net_time = gross_time - entry[2]
+            if event_type.startswith('gc-'):
+                info['gc'] += net_time
+            elif event_type.startswith('jit-'):
+                info['jit'] += net_time
+            else:
+                print 'WARNING: unknown event in PyPy instrumentation: %s' % event_type
+            if stack:
+                stack[-1][2] += net_time
         return net_time
 
 
+class ParserRegistry(object):
+    """Mapping from VM name -> parser class.
+    Parsers are registered as 'module:class' strings, in the style of
+    setuptools entry points, and a parser's module is only imported the first
+    time data from its VM is parsed. New parsers can therefore live outside
+    this module: either call register(), or name them in the
+    WARMUP_INSTR_PARSERS environment variable (see INSTR_PARSERS_ENV).
+    """
+
+    def __init__(self, entry_points):
+        self._entry_points = dict()
+        self._parsers = dict()  # VM name -> imported parser class.
+        for vm, entry_point in entry_points:
+            self.register(vm, entry_point)
+
+    def register(self, vm, entry_point):
+        assert ':' in entry_point, 'Expected module:class, not %s.' % entry_point
+        self._entry_points[vm] = entry_point
+        self._parsers.pop(vm, None)
+
+    def register_from_environment(self, value):
+        """Register each VM=module:class entry in a comma separated list."""
+
+        for item in value.split(','):
+            if not item.strip():
+                continue
+            assert '=' in item, 'Expected VM=module:class in %s, not %s.' % (INSTR_PARSERS_ENV, item)
+            vm, entry_point = item.split('=', 1)
+            self.register(vm.strip(), entry_point.strip())
+
+    def keys(self):
+        return sorted(self._entry_points.keys())
+
+    def __contains__(self, vm):
+        return vm in self._entry_points
+
+    def __getitem__(self, vm):
+        if vm not in self._parsers:
+            module_name, class_name = self._entry_points[vm].split(':')
+            self._parsers[vm] = getattr(importlib.import_module(module_name), class_name)
+        return self._parsers[vm]
+
+
 # Mapping from VM name -> parser class.
 # This enables the main scripts to parse instrumentation data based only
 # on the vm:bench:language triplets found in Krun data files.
-INSTRUMENTATION_PARSERS = { 'HotSpot': HotSpotInstrumentParser,
-                            'PyPy': PyPyInstrumentParser, }
+INSTRUMENTATION_PARSERS = ParserRegistry(
+    [('HotSpot', 'warmup.vm_instruments:HotSpotInstrumentParser'),
+     ('PyPy', 'warmup.vm_instruments:PyPyInstrumentParser')])
+INSTRUMENTATION_PARSERS.register_from_environment(os.environ.get(INSTR_PARSERS_ENV, ''))